@@ -0,0 +1,83 @@
+"""Incremental per-module rollups for assessment attempts and feedback.
+
+One document per module in ``db.module_stats`` is kept up to date with ``$inc``
+as attempts and feedback come in, so reporting reads O(modules) documents
+instead of scanning ``progress`` and ``feedback``.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+from pymongo import UpdateOne
+
+
+SCORE_BUCKETS = 10  # score percentage deciles; 100% falls into the last bucket
+
+
+def score_bucket(correct: int, total: int) -> int:
+    if total <= 0:
+        return 0
+    return min(int(correct * SCORE_BUCKETS / total), SCORE_BUCKETS - 1)
+
+
+async def record_attempt(db, module_id: str, correct: int, total: int, passed: bool):
+    """Fold one graded assessment attempt into the module rollup"""
+    await db.module_stats.update_one(
+        {"_id": module_id},
+        {"$inc": {
+            "attempts": 1,
+            "passes": 1 if passed else 0,
+            "score_sum": correct,
+            "question_sum": total,
+            f"score_histogram.{score_bucket(correct, total)}": 1,
+        }},
+        upsert=True,
+    )
+
+
+async def record_feedback(db, docs: Iterable[Dict[str, Any]]):
+    """Fold a batch of feedback documents into the module rollups
+
+    Ratings are summed per module first, so a batch costs one update per
+    module rather than one per document.
+    """
+    increments: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for doc in docs:
+        inc = increments[doc['module_id']]
+        inc["rating_sum"] += doc['rating']
+        inc["rating_count"] += 1
+        inc[f"rating_histogram.{doc['rating']}"] += 1
+
+    if increments:
+        await db.module_stats.bulk_write(
+            [UpdateOne({"_id": module_id}, {"$inc": dict(inc)}, upsert=True)
+             for module_id, inc in increments.items()],
+            ordered=False,
+        )
+
+
+def summarize(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive rates and averages from a raw rollup document"""
+    attempts = stats.get("attempts", 0)
+    question_sum = stats.get("question_sum", 0)
+    rating_count = stats.get("rating_count", 0)
+    histogram = stats.get("score_histogram", {})
+    return {
+        "attempts": attempts,
+        "passes": stats.get("passes", 0),
+        "pass_rate": round(stats.get("passes", 0) / attempts, 4) if attempts else 0.0,
+        "average_score_percentage": (
+            round(stats.get("score_sum", 0) / question_sum * 100, 1) if question_sum else 0.0
+        ),
+        "score_histogram": [histogram.get(str(i), 0) for i in range(SCORE_BUCKETS)],
+        "feedback_count": rating_count,
+        "average_rating": round(stats.get("rating_sum", 0) / rating_count, 2) if rating_count else None,
+        "rating_histogram": {
+            rating: count for rating, count in sorted(stats.get("rating_histogram", {}).items())
+        },
+    }
+
+
+async def load_module_stats(db) -> Dict[str, Dict[str, Any]]:
+    """All rollup documents keyed by module id"""
+    docs: List[Dict[str, Any]] = await db.module_stats.find({}).to_list(None)
+    return {doc['_id']: doc for doc in docs}
@@ -0,0 +1,377 @@
+"""Latency and throughput benchmark for the API routes.
+
+Drives every route on ``api_router`` in-process (httpx over ASGI, no network)
+against either a real mongod or an in-memory Mongo stand-in, and reports
+p50/p95/p99 latency and throughput per endpoint. Results are saved as JSON so
+runs from different commits can be compared:
+
+    python benchmark.py run --in-memory --requests 2000 --concurrency 50
+    python benchmark.py compare bench-old.json bench-new.json
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import typer
+
+
+cli = typer.Typer()
+
+
+@cli.callback()
+def main():
+    """Benchmark the API routes in-process"""
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    route: str  # route path as declared on api_router, used for coverage
+    # Builds (url, request kwargs) for one request from the shared fixture state
+    build: Callable[[Dict[str, Any]], tuple]
+    # Prepares single-use fixtures for that many requests, outside the timing
+    setup: Optional[Callable[[Any, Dict[str, Any], int], Awaitable[None]]] = None
+
+
+def _answers(attempt: Dict[str, Any]) -> Dict[str, str]:
+    # Pick a random option per question so scores (and upserts) vary
+    return {q['id']: random.choice(q.get('options') or [""]) for q in attempt['questions']}
+
+
+async def _start_attempt(client, token: str, module_id: str) -> Dict[str, Any]:
+    response = await client.post(f"/api/assessments/{module_id}/attempts",
+                                 headers={"authorization": f"Bearer {token}"})
+    return response.json()
+
+
+def _user(state: Dict[str, Any]) -> str:
+    return random.choice(state['user_ids'])
+
+
+def _session(state: Dict[str, Any], user_id: str) -> Dict[str, str]:
+    return {"authorization": f"Bearer {state['tokens'][user_id]}"}
+
+
+def _as_user(state: Dict[str, Any], url: str) -> tuple:
+    # A user-scoped GET made by that user
+    user_id = _user(state)
+    return url.format(user_id=user_id), {"headers": _session(state, user_id)}
+
+
+def _module(state: Dict[str, Any]) -> str:
+    return random.choice(state['module_ids'])
+
+
+async def _draw_attempts(client, state: Dict[str, Any], count: int):
+    # Attempts are graded once, so every submission needs a fresh one
+    state['attempts'] = []
+    for _ in range(count):
+        user_id, module_id = _user(state), _module(state)
+        state['attempts'].append((user_id, await _start_attempt(client, state['tokens'][user_id], module_id)))
+
+
+def _submission(state: Dict[str, Any]) -> tuple:
+    user_id, attempt = state['attempts'].pop()
+    return f"/api/assessments/{attempt['module_id']}/submit", {
+        "json": {"attempt_id": attempt['attempt_id'], "answers": _answers(attempt)},
+        "headers": _session(state, user_id),
+    }
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("create_user", "POST", "/api/users",
+             lambda s: ("/api/users", {"json": {"name": f"bench-{uuid.uuid4().hex[:8]}", "role": "staff"}})),
+    Scenario("create_users_bulk", "POST", "/api/users/bulk",
+             lambda s: ("/api/users/bulk", {
+                 "content": "\n".join(
+                     json.dumps({"name": f"bulk-{i}", "role": "student"}) for i in range(20)
+                 ).encode(),
+                 "headers": {"content-type": "application/x-ndjson", "x-admin-token": s['admin_token']},
+             })),
+    Scenario("list_modules", "GET", "/api/modules", lambda s: ("/api/modules", {})),
+    Scenario("current_user", "GET", "/api/users/me",
+             lambda s: ("/api/users/me", {"headers": _session(s, _user(s))})),
+    Scenario("refresh_session", "POST", "/api/sessions/refresh",
+             lambda s: ("/api/sessions/refresh", {"headers": _session(s, _user(s))})),
+    Scenario("issue_session", "POST", "/api/users/{user_id}/session",
+             lambda s: (f"/api/users/{_user(s)}/session", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("module_summary", "GET", "/api/modules/summary", lambda s: ("/api/modules/summary", {})),
+    Scenario("get_module", "GET", "/api/modules/{module_id}",
+             lambda s: (f"/api/modules/{_module(s)}", {})),
+    Scenario("get_module_html", "GET", "/api/modules/{module_id}",
+             lambda s: (f"/api/modules/{_module(s)}", {"params": {"format": "html"}})),
+    Scenario("get_module_section", "GET", "/api/modules/{module_id}/sections/{index}",
+             lambda s: (f"/api/modules/{_module(s)}/sections/0", {})),
+    Scenario("get_assessment", "GET", "/api/assessments/{module_id}",
+             lambda s: (f"/api/assessments/{_module(s)}", {})),
+    Scenario("start_attempt", "POST", "/api/assessments/{module_id}/attempts",
+             lambda s: (f"/api/assessments/{_module(s)}/attempts", {"headers": _session(s, _user(s))})),
+    Scenario("submit_assessment", "POST", "/api/assessments/{module_id}/submit",
+             _submission, _draw_attempts),
+    Scenario("submit_feedback", "POST", "/api/feedback",
+             lambda s: ("/api/feedback", {
+                 "json": {"module_id": _module(s), "rating": random.randint(1, 5), "comments": "benchmark"},
+                 "headers": _session(s, _user(s)),
+             })),
+    Scenario("feedback_queue", "GET", "/api/feedback/queue",
+             lambda s: ("/api/feedback/queue", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("get_progress", "GET", "/api/progress/{user_id}",
+             lambda s: _as_user(s, "/api/progress/{user_id}")),
+    Scenario("list_progress", "GET", "/api/progress",
+             lambda s: ("/api/progress", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("list_module_progress", "GET", "/api/modules/{module_id}/progress",
+             lambda s: (f"/api/modules/{_module(s)}/progress",
+                        {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("list_module_feedback", "GET", "/api/modules/{module_id}/feedback",
+             lambda s: (f"/api/modules/{_module(s)}/feedback",
+                        {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("dashboard", "GET", "/api/dashboard/{user_id}",
+             lambda s: _as_user(s, "/api/dashboard/{user_id}")),
+    Scenario("certificate", "GET", "/api/certificates/{user_id}",
+             lambda s: (f"/api/certificates/{s['graduate']}", {"headers": _session(s, s['graduate'])})),
+    Scenario("module_analytics", "GET", "/api/analytics/modules",
+             lambda s: ("/api/analytics/modules", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("leaderboard", "GET", "/api/leaderboard",
+             lambda s: ("/api/leaderboard", {"params": {"limit": 10}, "headers": _session(s, _user(s))})),
+    Scenario("leaderboard_rank", "GET", "/api/leaderboard/users/{user_id}",
+             lambda s: _as_user(s, "/api/leaderboard/users/{user_id}")),
+    Scenario("leaderboard_cohorts", "GET", "/api/leaderboard/cohorts",
+             lambda s: ("/api/leaderboard/cohorts", {"headers": _session(s, _user(s))})),
+    Scenario("export_progress", "GET", "/api/export/progress",
+             lambda s: ("/api/export/progress", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("catalog_stats", "GET", "/api/catalog/stats",
+             lambda s: ("/api/catalog/stats", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("item_analysis", "GET", "/api/admin/item-analysis",
+             lambda s: ("/api/admin/item-analysis", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("task_queue_status", "GET", "/api/admin/tasks",
+             lambda s: ("/api/admin/tasks", {"headers": {"x-admin-token": s['admin_token']}})),
+    Scenario("profiler_status", "GET", "/api/admin/profiler",
+             lambda s: ("/api/admin/profiler", {"headers": {"x-admin-token": s['admin_token']}})),
+    # Empty settings leave the profiler as configured for the run
+    Scenario("profiler_update", "POST", "/api/admin/profiler",
+             lambda s: ("/api/admin/profiler", {"json": {}, "headers": {"x-admin-token": s['admin_token']}})),
+]
+
+
+def _use_in_memory_mongo():
+    """Swap Motor's client for mongomock before the app module is imported"""
+    try:
+        import mongomock_motor
+    except ImportError:
+        raise typer.BadParameter("--in-memory needs the mongomock-motor package")
+    import motor.motor_asyncio
+
+    class InMemoryClient(mongomock_motor.AsyncMongoMockClient):
+        def __init__(self, *args, **kwargs):
+            # Pool and timeout settings mean nothing to the stand-in
+            super().__init__()
+
+    motor.motor_asyncio.AsyncIOMotorClient = InMemoryClient
+    # mongomock's with_options returns a synchronous handle; read preferences
+    # mean nothing to the stand-in either, so keep the async one
+    mongomock_motor.AsyncMongoMockDatabase.with_options = lambda self, *args, **kwargs: self
+    mongomock_motor.AsyncMongoMockCollection.with_options = lambda self, *args, **kwargs: self
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(ms.mean()), 3) if len(ms) else 0.0,
+        "max_ms": round(float(ms.max()), 3) if len(ms) else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+async def _drive(client, scenario: Scenario, state: Dict[str, Any],
+                 requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+    if scenario.setup is not None:
+        await scenario.setup(client, state, requests)
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            url, kwargs = scenario.build(state)
+            started = time.perf_counter()
+            response = await client.request(scenario.method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def _prepare(client, users: int) -> Dict[str, Any]:
+    modules = (await client.get("/api/modules/summary")).json()['items']
+    module_ids = [m['id'] for m in modules]
+    tokens = {}
+    for i in range(users):
+        response = await client.post("/api/users", json={"name": f"bench-user-{i}", "role": "staff"})
+        tokens[response.json()['id']] = response.json()['token']
+    # One attempt each so user-scoped reads (progress, dashboard, rank) find rows
+    for user_id, token in tokens.items():
+        attempt = await _start_attempt(client, token, random.choice(module_ids))
+        await client.post(
+            f"/api/assessments/{attempt['module_id']}/submit",
+            json={"attempt_id": attempt['attempt_id'], "answers": _answers(attempt)},
+            headers={"authorization": f"Bearer {token}"},
+        )
+    return {
+        "module_ids": module_ids,
+        "user_ids": list(tokens),
+        "tokens": tokens,
+        "admin_token": os.environ['ADMIN_TOKEN'],
+    }
+
+
+async def _graduate(client, state: Dict[str, Any], assessments: List[Dict[str, Any]]):
+    """Create a user who passed every module, for the certificate scenario"""
+    response = await client.post("/api/users", json={"name": "bench-graduate", "role": "staff"})
+    user_id, token = response.json()['id'], response.json()['token']
+    for assessment in assessments:
+        correct = {q['id']: q['correct_answer'] for q in assessment['questions']}
+        attempt = await _start_attempt(client, token, assessment['module_id'])
+        answers = {q['id']: correct[q['id']] for q in attempt['questions']}
+        await client.post(f"/api/assessments/{assessment['module_id']}/submit",
+                          json={"attempt_id": attempt['attempt_id'], "answers": answers},
+                          headers={"authorization": f"Bearer {token}"})
+    state['graduate'] = user_id
+    state['tokens'][user_id] = token
+
+
+async def _run(requests: int, concurrency: int, users: int, warmup: int,
+               only: Optional[List[str]]) -> Dict[str, Any]:
+    import httpx
+    import server
+
+    covered = {(s.method, s.route) for s in SCENARIOS}
+    for route in server.api_router.routes:
+        for method in route.methods - {"HEAD", "OPTIONS"}:
+            if (method, route.path) not in covered:
+                typer.echo(f"warning: no scenario for {method} {route.path}", err=True)
+
+    results: Dict[str, Any] = {}
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            state = await _prepare(client, users)
+            await _graduate(client, state, server.ASSESSMENTS_DATA)
+            # Fixture submissions are applied in the background; let them land first
+            await server.task_queue.join()
+            for scenario in SCENARIOS:
+                if only and scenario.name not in only:
+                    continue
+                if warmup:
+                    await _drive(client, scenario, state, warmup, min(concurrency, warmup))
+                results[scenario.name] = await _drive(client, scenario, state, requests, concurrency)
+                r = results[scenario.name]
+                typer.echo(
+                    f"{scenario.name:<20} p50 {r['p50_ms']:>8.2f} ms  p95 {r['p95_ms']:>8.2f} ms  "
+                    f"p99 {r['p99_ms']:>8.2f} ms  {r['throughput_rps']:>9.1f} req/s  errors {r['errors']}"
+                )
+    finally:
+        await server.app.router.shutdown()
+        if not os.environ.get('BENCH_KEEP_DB'):
+            await server.client.drop_database(os.environ['DB_NAME'])
+    return results
+
+
+@cli.command("run")
+def run_command(
+    output: Optional[Path] = typer.Option(None, help="JSON results file (default: bench-<commit>.json)"),
+    requests: int = typer.Option(1000, help="Requests per endpoint"),
+    concurrency: int = typer.Option(20, help="Concurrent in-flight requests"),
+    users: int = typer.Option(100, help="Users created up front and reused by the scenarios"),
+    warmup: int = typer.Option(50, help="Unmeasured requests per endpoint before measuring"),
+    in_memory: bool = typer.Option(False, "--in-memory", help="Use mongomock instead of MONGO_URL"),
+    only: Optional[List[str]] = typer.Option(None, help="Scenario name to run (repeatable)"),
+    seed: int = typer.Option(0, help="Random seed for request payloads"),
+):
+    """Benchmark every endpoint and save p50/p95/p99 latency and throughput"""
+    random.seed(seed)
+    backend_dir = Path(__file__).parent
+    sys.path.insert(0, str(backend_dir))
+    if in_memory:
+        _use_in_memory_mongo()
+    # Never benchmark against the application database; the bench database is dropped afterwards
+    os.environ['DB_NAME'] = f"bench_{uuid.uuid4().hex[:8]}"
+    os.environ.setdefault('ADMIN_TOKEN', uuid.uuid4().hex)
+
+    results = asyncio.run(_run(requests, concurrency, users, warmup, only))
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "mongo": "in-memory" if in_memory else "mongod",
+            "requests": requests,
+            "concurrency": concurrency,
+            "users": users,
+            "seed": seed,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    output = output or Path(f"bench-{commit or 'local'}.json")
+    output.write_text(json.dumps(report, indent=2))
+    typer.echo(f"Saved results to {output}")
+
+
+@cli.command("compare")
+def compare_command(
+    baseline: Path = typer.Argument(..., exists=True, dir_okay=False),
+    candidate: Path = typer.Argument(..., exists=True, dir_okay=False),
+    metric: str = typer.Option("p95_ms", help="Latency metric to compare"),
+    threshold: float = typer.Option(10.0, help="Regression threshold in percent"),
+):
+    """Compare two result files and exit non-zero if any endpoint regressed"""
+    old = json.loads(baseline.read_text())['results']
+    new = json.loads(candidate.read_text())['results']
+    regressed = False
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name][metric], new[name][metric]
+        change = (after - before) / before * 100 if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        typer.echo(f"{name:<20} {before:>9.2f} -> {after:>9.2f} ms  {change:+6.1f}%{flag}")
+    if regressed:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
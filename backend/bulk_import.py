@@ -0,0 +1,143 @@
+"""Streaming bulk import: request body in, one result line per row out.
+
+The body is consumed chunk by chunk, rows are validated as they arrive and
+written with unordered ``insert_many`` batches, so neither the server nor the
+caller ever holds the whole file in memory.
+"""
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+
+CSV = "csv"
+NDJSON = "ndjson"
+
+Record = Union[Dict[str, Any], Exception]
+
+
+def detect_format(content_type: str) -> str:
+    """Map a Content-Type header to an import format (NDJSON unless it says CSV)"""
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return CSV
+    return NDJSON
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines without buffering more than one line"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, Record]]:
+    """Yield ``(row_number, record)``; unparseable rows yield the exception instead"""
+    header = None
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        if fmt == CSV:
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            if len(values) != len(header):
+                yield row, ValueError(f"expected {len(header)} columns, got {len(values)}")
+            else:
+                yield row, dict(zip(header, values))
+        else:
+            row += 1
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield row, exc
+                continue
+            if isinstance(record, dict):
+                yield row, record
+            else:
+                yield row, ValueError("expected a JSON object")
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        )
+    return str(exc)
+
+
+async def _write_batch(collection, batch: List[Tuple[int, Dict[str, Any]]],
+                       created: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    failed: Dict[int, str] = {}
+    try:
+        await collection.insert_many([doc for _, doc in batch], ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get('writeErrors', []):
+            failed[error['index']] = error.get('errmsg', 'write failed')
+
+    results = []
+    for i, (row, doc) in enumerate(batch):
+        if i in failed:
+            results.append({"row": row, "status": "error", "error": failed[i]})
+        else:
+            result = {"row": row, "status": "created", "id": doc['id']}
+            if created is not None:
+                result.update(created(doc))
+            results.append(result)
+    return results
+
+
+async def bulk_insert(collection, records: AsyncIterator[Tuple[int, Record]],
+                      build_doc: Callable[[Dict[str, Any]], Dict[str, Any]],
+                      batch_size: int = 1000,
+                      created: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                      ) -> AsyncIterator[Dict[str, Any]]:
+    """Validate records with ``build_doc`` and insert them in batches
+
+    Yields one result per row, in row order: ``created`` with the new id (plus
+    whatever ``created(doc)`` returns) or ``error`` with the reason (parse,
+    validation or write failure).
+    """
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    # Rows rejected while a batch is pending are held back so results stay in row order
+    rejected: List[Dict[str, Any]] = []
+
+    async for row, record in records:
+        if not isinstance(record, Exception):
+            try:
+                batch.append((row, build_doc(record)))
+            except (ValidationError, ValueError, TypeError) as exc:
+                record = exc
+        if isinstance(record, Exception):
+            if not batch:
+                yield {"row": row, "status": "error", "error": _error_message(record)}
+            else:
+                rejected.append({"row": row, "status": "error", "error": _error_message(record)})
+            continue
+
+        if len(batch) >= batch_size:
+            for result in _merge(await _write_batch(collection, batch, created), rejected):
+                yield result
+            batch, rejected = [], []
+
+    if batch:
+        for result in _merge(await _write_batch(collection, batch, created), rejected):
+            yield result
+
+
+def _merge(written: List[Dict[str, Any]], rejected: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return sorted(written + rejected, key=lambda result: result['row'])
@@ -0,0 +1,229 @@
+"""In-process cache of the training catalog (modules and assessments).
+
+Each worker keeps its own copy of the catalog in memory. The copy is tagged
+with the catalog version counter stored in ``db.meta``; whoever changes the
+catalog bumps that counter and every worker reloads on its next version check.
+"""
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from scoring import AnswerKey
+
+
+logger = logging.getLogger(__name__)
+
+CATALOG_META_ID = "catalog"
+
+# Fields the module listings need; lesson bodies and video links are left out
+SUMMARY_FIELDS = ("id", "title", "description", "order", "duration")
+
+
+async def get_catalog_version(db) -> int:
+    """Read the current catalog version counter (0 if never set)"""
+    doc = await db.meta.find_one({"_id": CATALOG_META_ID}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+async def get_catalog_meta(db) -> Tuple[int, Optional[str]]:
+    """Read the catalog version counter and content hash of the synced catalog"""
+    doc = await db.meta.find_one({"_id": CATALOG_META_ID}, {"version": 1, "content_hash": 1})
+    if not doc:
+        return 0, None
+    return doc.get("version", 0), doc.get("content_hash")
+
+
+async def bump_catalog_version(db) -> int:
+    """Increment the catalog version so that every worker drops its cached copy"""
+    doc = await db.meta.find_one_and_update(
+        {"_id": CATALOG_META_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+def strip_answers(assessment: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the client-facing copy of an assessment (without correct answers)"""
+    questions = []
+    for q in assessment['questions']:
+        question_copy = q.copy()
+        question_copy.pop('correct_answer', None)
+        questions.append(question_copy)
+
+    return {
+        "id": assessment['id'],
+        "module_id": assessment['module_id'],
+        "questions": questions
+    }
+
+
+class CatalogSnapshot:
+    """Read-only view of the catalog at a single version"""
+
+    def __init__(self, version: int, modules: List[Dict[str, Any]], assessments: List[Dict[str, Any]],
+                 content_hash: Optional[str] = None, mapped=None):
+        self.version = version
+        self.content_hash = content_hash
+        # Snapshot file with pre-encoded bodies for this exact catalog content, if any
+        self.mapped = mapped
+        # Ordered by (order, id) so modules sharing an order still page deterministically
+        modules = sorted(modules, key=lambda m: (m['order'], m['id']))
+        self.modules = modules
+        self.modules_by_id = {m['id']: m for m in modules}
+        self.summaries = [{f: m[f] for f in SUMMARY_FIELDS if f in m} for m in modules]
+        self._orders = [m['order'] for m in modules]
+        self._keys = [(m['order'], m['id']) for m in modules]
+        self.assessments = {a['module_id']: a for a in assessments}
+        self.public_assessments = {
+            module_id: strip_answers(a) for module_id, a in self.assessments.items()
+        }
+        self.answer_keys = {
+            module_id: AnswerKey.compile(a) for module_id, a in self.assessments.items()
+        }
+        self._derived: Dict[Any, Any] = {}
+
+    def summary_page(self, after: Optional[int], limit: int,
+                     after_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, str]]]:
+        """Return up to ``limit`` module summaries after the ``(after, after_id)`` cursor
+
+        Modules are kept sorted by ``(order, id)``, so a page is a bisect plus
+        a slice. Without ``after_id`` every module with order ``after`` is
+        skipped. The second element is the ``(order, id)`` cursor for the next
+        page (None on the last one).
+        """
+        if after is None:
+            start = 0
+        elif after_id is None:
+            start = bisect.bisect_right(self._orders, after)
+        else:
+            start = bisect.bisect_right(self._keys, (after, after_id))
+        items = self.summaries[start:start + limit]
+        has_more = start + limit < len(self.summaries)
+        return items, (self._keys[start + len(items) - 1] if items and has_more else None)
+
+    def derived(self, key: Any, build: Callable[[], Any]) -> Any:
+        """Memoize a value computed from this snapshot (e.g. an encoded response body)
+
+        Derived values live and die with the snapshot, so they are rebuilt
+        automatically when the catalog version changes.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = build()
+            return value
+
+    def payload(self, key: str, build: Callable[[], Any]) -> Any:
+        """Encoded response body for ``key``
+
+        Served straight from the mapped snapshot file when it has the body,
+        otherwise built once per version like any derived value.
+        """
+        if self.mapped is not None:
+            mapped = self.mapped.payload(key)
+            if mapped is not None:
+                return mapped
+        return self.derived(key, build)
+
+
+class CatalogCache:
+    """Serve the catalog from memory, reloading when the version counter moves.
+
+    The version counter is read at most once every ``check_interval`` seconds,
+    so in steady state a catalog read costs no database round trip at all.
+    ``read_preference`` applies to the version check and the reload alike, so
+    a snapshot is never tagged with a version read from a different member.
+
+    When ``snapshot_file`` (a ``MappedSnapshot``) carries the same content
+    hash as the synced catalog, the catalog is loaded from the file instead of
+    Mongo and its pre-encoded response bodies are served from the mapping.
+    """
+
+    def __init__(self, db, check_interval: float = 5.0, read_preference=None, snapshot_file=None):
+        if read_preference is not None:
+            db = db.with_options(read_preference=read_preference)
+        self._db = db
+        self.snapshot_file = snapshot_file
+        self.snapshot_loads = 0
+        self.check_interval = check_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and time.monotonic() - self._checked_at < self.check_interval
+        )
+
+    async def get(self) -> CatalogSnapshot:
+        """Return the current catalog snapshot"""
+        if self._is_fresh():
+            self.hits += 1
+            return self._snapshot
+
+        async with self._lock:
+            # Another request may have refreshed the snapshot while we waited
+            if self._is_fresh():
+                self.hits += 1
+                return self._snapshot
+
+            self.version_checks += 1
+            version, content_hash = await get_catalog_meta(self._db)
+            if self._snapshot is not None and self._snapshot.version == version:
+                self._checked_at = time.monotonic()
+                self.hits += 1
+                return self._snapshot
+
+            self.misses += 1
+            self._snapshot = await self._load(version, content_hash)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    async def _load(self, version: int, content_hash: Optional[str] = None) -> CatalogSnapshot:
+        started = time.perf_counter()
+        mapped = self.snapshot_file
+        if mapped is not None and content_hash is not None and mapped.content_hash == content_hash:
+            catalog = mapped.catalog()
+            self.snapshot_loads += 1
+            logger.info(
+                "Loaded catalog version %s from snapshot %s in %.1f ms",
+                version, mapped.path, (time.perf_counter() - started) * 1000,
+            )
+            return CatalogSnapshot(version, catalog["modules"], catalog["assessments"], content_hash, mapped)
+
+        modules, assessments = await asyncio.gather(
+            self._db.modules.find({}, {"_id": 0}).sort([("order", 1), ("id", 1)]).to_list(None),
+            self._db.assessments.find({}, {"_id": 0}).to_list(None),
+        )
+        logger.info(
+            "Loaded catalog version %s (%d modules, %d assessments) in %.1f ms",
+            version, len(modules), len(assessments), (time.perf_counter() - started) * 1000,
+        )
+        return CatalogSnapshot(version, modules, assessments, content_hash)
+
+    def invalidate(self):
+        """Force a version check on the next read"""
+        self._checked_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "version": self._snapshot.version if self._snapshot else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "version_checks": self.version_checks,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "snapshot_loads": self.snapshot_loads,
+            "snapshot_in_use": self._snapshot is not None and self._snapshot.mapped is not None,
+        }
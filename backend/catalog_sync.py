@@ -0,0 +1,176 @@
+"""Sync the in-code catalog into MongoDB by content hash.
+
+The catalog document in ``db.meta`` stores a hash of the whole in-code
+catalog plus one hash per module and assessment. At startup a worker hashes
+its copy and compares it with the stored hash: when they match (the usual
+case) the sync costs a single ``find_one``. Otherwise the worker that takes
+the ``db.locks`` lease upserts only the items whose hash changed, deletes
+items that were removed from the code, and bumps the catalog version in the
+same update that records the new hashes. Workers that lose the race wait
+for the winner instead of writing the same documents again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from catalog import CATALOG_META_ID
+
+
+logger = logging.getLogger(__name__)
+
+SYNC_LOCK_ID = "catalog-sync"
+
+# Field identifying each catalog item in its collection (backed by a unique index)
+ITEM_KEYS = {"modules": "id", "assessments": "module_id"}
+
+
+def content_hash(doc: Any) -> str:
+    """Stable SHA-256 of a JSON-like document, ignoring Mongo's ``_id``"""
+    if isinstance(doc, dict):
+        doc = {key: value for key, value in doc.items() if key != "_id"}
+    encoded = json.dumps(doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def item_hashes(items: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, str]]:
+    """Per-collection ``{key: hash}`` for every catalog item"""
+    return {
+        name: {doc[ITEM_KEYS[name]]: content_hash(doc) for doc in docs}
+        for name, docs in items.items()
+    }
+
+
+def catalog_hash(hashes: Dict[str, Dict[str, str]]) -> str:
+    return content_hash(hashes)
+
+
+class SyncLock:
+    """Lease-based lock document in ``db.locks``
+
+    The lease expires after ``ttl`` seconds so a worker that dies mid-sync
+    cannot block the others forever.
+    """
+
+    def __init__(self, db, lock_id: str, ttl: float = 30.0):
+        self._locks = db.locks
+        self.lock_id = lock_id
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches a free or expired lease; if someone else holds it the
+            # upsert collides on _id and we lose
+            await self._locks.find_one_and_update(
+                {"_id": self.lock_id, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def release(self):
+        await self._locks.delete_one({"_id": self.lock_id, "owner": self.owner})
+
+
+async def _stored_hashes(db) -> Tuple[Optional[str], Dict[str, Dict[str, str]]]:
+    doc = await db.meta.find_one({"_id": CATALOG_META_ID}, {"content_hash": 1, "item_hashes": 1})
+    if not doc:
+        return None, {}
+    return doc.get("content_hash"), doc.get("item_hashes", {})
+
+
+def _changes(collection: str, docs: List[Dict[str, Any]], wanted: Dict[str, str],
+             stored: Dict[str, str]) -> list:
+    key = ITEM_KEYS[collection]
+    ops = []
+    for doc in docs:
+        if stored.get(doc[key]) != wanted[doc[key]]:
+            replacement = {field: value for field, value in doc.items() if field != "_id"}
+            ops.append(ReplaceOne({key: doc[key]}, replacement, upsert=True))
+    # Only items a previous sync wrote are removed; anything else is left alone
+    for removed in stored.keys() - wanted.keys():
+        ops.append(DeleteOne({key: removed}))
+    return ops
+
+
+async def sync_catalog(db, modules: List[Dict[str, Any]], assessments: List[Dict[str, Any]],
+                       lock_ttl: float = 30.0, wait_timeout: float = 30.0,
+                       force: bool = False) -> Dict[str, Any]:
+    """Bring the catalog collections in line with the in-code catalog
+
+    Returns what happened: ``unchanged``, ``synced`` (with per-collection
+    write counts), ``waited`` when another worker did the sync, or
+    ``timeout`` when the lock could not be taken within ``wait_timeout``.
+    """
+    items = {"modules": modules, "assessments": assessments}
+    wanted = item_hashes(items)
+    wanted_hash = catalog_hash(wanted)
+
+    stored_hash, _ = await _stored_hashes(db)
+    if stored_hash == wanted_hash and not force:
+        return {"status": "unchanged", "content_hash": wanted_hash}
+
+    lock = SyncLock(db, SYNC_LOCK_ID, ttl=lock_ttl)
+    deadline = time.monotonic() + wait_timeout
+    while not await lock.acquire():
+        if time.monotonic() > deadline:
+            logger.warning("Gave up waiting for the catalog sync lock")
+            return {"status": "timeout", "content_hash": wanted_hash}
+        await asyncio.sleep(0.2)
+        stored_hash, _ = await _stored_hashes(db)
+        if stored_hash == wanted_hash and not force:
+            return {"status": "waited", "content_hash": wanted_hash}
+
+    try:
+        started = time.perf_counter()
+        # Re-read under the lock: the previous holder may have just finished
+        stored_hash, stored = await _stored_hashes(db)
+        if stored_hash == wanted_hash and not force:
+            return {"status": "waited", "content_hash": wanted_hash}
+        if force:
+            stored = {}
+
+        written = {}
+        for collection, docs in items.items():
+            ops = _changes(collection, docs, wanted[collection], stored.get(collection, {}))
+            if ops:
+                await db[collection].bulk_write(ops, ordered=False)
+            written[collection] = len(ops)
+
+        # Recording the hashes and bumping the version in one update lets every
+        # worker's catalog cache pick up the change on its next version check
+        meta = await db.meta.find_one_and_update(
+            {"_id": CATALOG_META_ID},
+            {
+                "$set": {
+                    "content_hash": wanted_hash,
+                    "item_hashes": wanted,
+                    "synced_at": datetime.now(timezone.utc),
+                },
+                "$inc": {"version": 1},
+            },
+            upsert=True,
+            projection={"version": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        logger.info(
+            f"Catalog synced in {(time.perf_counter() - started) * 1000:.1f} ms: "
+            f"{written['modules']} module and {written['assessments']} assessment writes, "
+            f"version {meta['version']}"
+        )
+        return {"status": "synced", "content_hash": wanted_hash, "version": meta['version'], "writes": written}
+    finally:
+        await lock.release()
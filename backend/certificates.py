@@ -0,0 +1,251 @@
+"""Completion certificates rendered to PDF and cached on disk by content.
+
+A certificate is a pure function of the user's name and their completed
+module results, so it is keyed by a hash of exactly those inputs (plus the
+template version). Each key is rendered once, in a worker process so the
+event loop never waits on it, and written to ``{user_id}.{key}.pdf``; every
+later download for the same results is the file as-is. Improving a score
+changes the key, and the user's superseded file is removed.
+
+The PDF is written by hand (one landscape A4 page, the standard Helvetica
+fonts and a deflated content stream), so rendering needs no extra packages.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so cached certificates are rendered again
+TEMPLATE_VERSION = 1
+PROGRAM_TITLE = "Social Engineering & Human Hacking"
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape, in points
+
+# Advance widths (1/1000 em) of the printable ASCII range, from the Adobe core font metrics
+_WIDTHS = {
+    "F1": [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ],
+    "F2": [
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ],
+}
+_FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+
+class CertificateUnavailable(Exception):
+    """Raised when the user has not passed every module yet"""
+
+
+def certificate_data(user: Dict[str, Any], modules: List[Dict[str, Any]],
+                     progress: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Everything printed on the certificate, from the catalog and ``db.progress``"""
+    by_module = {p['module_id']: p for p in progress}
+    remaining = [m['id'] for m in modules if not by_module.get(m['id'], {}).get('completed')]
+    if not modules or remaining:
+        raise CertificateUnavailable(f"{len(remaining)} of {len(modules)} modules not passed yet")
+
+    results = []
+    for module in modules:
+        row = by_module[module['id']]
+        results.append({
+            "module_id": module['id'],
+            "title": module['title'],
+            "score": row.get('score'),
+            "total": row.get('total_questions'),
+            "completed_at": row.get('completed_at') or "",
+        })
+    return {
+        "template": TEMPLATE_VERSION,
+        "user_id": user['id'],
+        "name": user['name'],
+        "completed_on": max(r['completed_at'] for r in results)[:10],
+        "modules": results,
+    }
+
+
+def certificate_key(data: Dict[str, Any]) -> str:
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+def _text_width(text: str, font: str, size: float) -> float:
+    widths = _WIDTHS[font]
+    return sum(widths[ord(c) - 32] if 32 <= ord(c) < 127 else 556 for c in text) * size / 1000
+
+
+def _literal(text: str) -> str:
+    encoded = text.encode("cp1252", errors="replace").decode("latin-1")
+    return "(" + encoded.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def _fit(text: str, font: str, size: float, max_width: float) -> str:
+    if _text_width(text, font, size) <= max_width:
+        return text
+    while text and _text_width(text + "...", font, size) > max_width:
+        text = text[:-1]
+    return text.rstrip() + "..."
+
+
+def render_pdf(data: Dict[str, Any]) -> bytes:
+    """Lay out and serialize the certificate; runs in a worker process"""
+    ops: List[str] = []
+
+    def text(value: str, font: str, size: float, y: float, x: Optional[float] = None,
+             gray: float = 0.0, max_width: float = PAGE_WIDTH - 160):
+        value = _fit(value, font, size, max_width)
+        if x is None:
+            x = (PAGE_WIDTH - _text_width(value, font, size)) / 2
+        ops.append(f"BT {gray:.2f} g /{font} {size} Tf {x:.2f} {y:.2f} Td {_literal(value)} Tj ET")
+
+    # Double border
+    ops.append("0.15 0.35 0.75 RG 4 w 28 28 786 539 re S 1 w 40 40 762 515 re S")
+
+    text("CERTIFICATE OF COMPLETION", "F2", 30, 480)
+    text("This certifies that", "F1", 14, 440, gray=0.35)
+    text(data['name'], "F2", 32, 395)
+    ops.append("0.6 G 0.75 w 221 385 m 621 385 l S")
+    text("has successfully completed the training program", "F1", 14, 355, gray=0.35)
+    text(PROGRAM_TITLE, "F2", 20, 322)
+
+    modules = data['modules']
+    row_height = min(20.0, 170.0 / max(len(modules), 1))
+    size = min(11.0, row_height * 0.6)
+    y = 285.0
+    for module in modules:
+        score = f"{module['score']}/{module['total']}" if module['total'] else ""
+        text(module['title'], "F1", size, y, x=190, max_width=390)
+        text(score, "F2", size, y, x=652 - _text_width(score, "F2", size))
+        y -= row_height
+
+    text(f"Completed on {data['completed_on']}", "F1", 11, 80, x=90, gray=0.35)
+    certificate_id = f"Certificate ID {certificate_key(data)[:16]}"
+    text(certificate_id, "F1", 11, 80, x=PAGE_WIDTH - 90 - _text_width(certificate_id, "F1", 11), gray=0.35)
+
+    stream = zlib.compress("\n".join(ops).encode("latin-1"), 9)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+         f"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>").encode(),
+        *(
+            f"<< /Type /Font /Subtype /Type1 /BaseFont /{_FONTS[font]} /Encoding /WinAnsiEncoding >>".encode()
+            for font in ("F1", "F2")
+        ),
+        f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode() + stream + b"\nendstream",
+        f"<< /Title {_literal('Certificate of Completion - ' + data['name'])} /Producer (SETP) >>".encode("latin-1"),
+    ]
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info {len(objects)} 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode()
+    return bytes(out)
+
+
+class CertificateStore:
+    """Disk cache of rendered certificates in front of a process pool"""
+
+    def __init__(self, directory: Path, workers: int = 1):
+        self.directory = Path(directory)
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.renders = 0
+        self.render_ms_total = 0.0
+
+    def path(self, user_id: str, key: str) -> Path:
+        return self.directory / f"{user_id}.{key}.pdf"
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned rather than forked: the server process runs threads
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def get(self, data: Dict[str, Any]) -> Path:
+        """Path of the rendered certificate, rendering it first on a miss"""
+        key = certificate_key(data)
+        path = self.path(data['user_id'], key)
+        if path.exists():
+            self.hits += 1
+            return path
+
+        pending = self._rendering.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self._rendering[key] = asyncio.get_running_loop().create_future()
+        try:
+            await self._render(data, path)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as exc:
+            pending.set_exception(exc)
+            # Retrieved here so a render nobody else waited on is not logged as unhandled
+            pending.exception()
+            raise
+        else:
+            pending.set_result(path)
+        finally:
+            del self._rendering[key]
+        return path
+
+    async def _render(self, data: Dict[str, Any], path: Path):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        pdf = await loop.run_in_executor(self._executor(), render_pdf, data)
+        self.renders += 1
+        self.render_ms_total += (loop.time() - started) * 1000
+
+        def write():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(pdf)
+            os.replace(tmp, path)
+            # A certificate for the user's earlier results is never served again
+            for old in self.directory.glob(f"{data['user_id']}.*.pdf"):
+                if old != path:
+                    old.unlink(missing_ok=True)
+
+        await asyncio.to_thread(write)
+        logger.info(f"Rendered certificate {path.name} ({len(pdf)} bytes)")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "renders": self.renders,
+            "rendering": len(self._rendering),
+            "avg_render_ms": round(self.render_ms_total / self.renders, 3) if self.renders else 0.0,
+        }
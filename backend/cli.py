@@ -0,0 +1,252 @@
+"""Operational commands for the training backend.
+
+Run from the backend directory, e.g. ``python cli.py dedupe-progress --dry-run``.
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from itertools import islice
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+from catalog import CatalogSnapshot
+from catalog_sync import catalog_hash, item_hashes, sync_catalog
+from export import CSV, ExportUnavailable, check_format, export_progress
+from indexes import check_indexes, ensure_indexes
+from migrations import dedupe_progress
+from scoring import result_for
+from snapshot import write_snapshot
+
+
+cli = typer.Typer()
+
+
+@cli.callback()
+def main():
+    """Operational commands for the training backend"""
+
+
+def _server():
+    """Import the app module on first use
+
+    Importing it opens a Mongo client sized from WEB_CONCURRENCY, which
+    ``serve`` has to set first and must not share with its workers.
+    """
+    import server
+    return server
+
+
+def _run(coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        _server().client.close()
+
+
+@cli.command("dedupe-progress")
+def dedupe_progress_command(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only report what would be removed"),
+):
+    """Remove duplicate (user_id, module_id) progress rows and add the unique index"""
+    server = _server()
+
+    async def run():
+        result = await dedupe_progress(server.db, dry_run=dry_run)
+        if not dry_run:
+            await ensure_indexes(server.db, collections=["progress"])
+        return result
+
+    result = _run(run())
+    typer.echo(
+        f"{result['duplicated_pairs']} duplicated pairs, "
+        f"{result['removed']} rows {'to remove' if dry_run else 'removed'}"
+    )
+
+
+@cli.command("check-indexes")
+def check_indexes_command(
+    fix: bool = typer.Option(False, "--fix", help="Create missing indexes after reporting"),
+):
+    """Report drift between the index registry and the database"""
+    server = _server()
+
+    async def run():
+        drift = await check_indexes(server.db)
+        if fix and drift["missing"]:
+            await ensure_indexes(server.db)
+        return drift
+
+    drift = _run(run())
+    for kind in ("missing", "mismatched", "unexpected"):
+        for name in drift[kind]:
+            typer.echo(f"{kind}: {name}")
+    if any(drift.values()):
+        raise typer.Exit(code=0 if fix and not (drift["mismatched"] or drift["unexpected"]) else 1)
+    typer.echo("Indexes match the registry")
+
+
+@cli.command("sync-catalog")
+def sync_catalog_command(
+    force: bool = typer.Option(False, "--force", help="Rewrite every item even if the hashes match"),
+):
+    """Sync modules and assessments with the catalog defined in server.py"""
+    server = _server()
+    result = _run(sync_catalog(server.db, server.MODULES_DATA, server.ASSESSMENTS_DATA, force=force))
+    typer.echo(f"{result['status']}: content hash {result['content_hash']}")
+    for collection, count in result.get('writes', {}).items():
+        typer.echo(f"{collection}: {count} writes")
+
+
+def _build_snapshot(output: Path) -> int:
+    server = _server()
+    content_hash = catalog_hash(item_hashes({"modules": server.MODULES_DATA, "assessments": server.ASSESSMENTS_DATA}))
+    # Same shape the catalog cache reads from Mongo: no _id, modules sorted by (order, id)
+    modules = sorted(
+        ({k: v for k, v in m.items() if k != "_id"} for m in server.MODULES_DATA), key=lambda m: (m['order'], m['id'])
+    )
+    assessments = [{k: v for k, v in a.items() if k != "_id"} for a in server.ASSESSMENTS_DATA]
+    catalog = CatalogSnapshot(0, modules, assessments, content_hash)
+    return write_snapshot(
+        output, content_hash,
+        {"modules": modules, "assessments": assessments},
+        server.catalog_payloads(catalog),
+        server.catalog_section_counts(catalog),
+    )
+
+
+@cli.command("build-snapshot")
+def build_snapshot_command(
+    output: Path = typer.Argument(Path("catalog.snapshot"), dir_okay=False, help="Snapshot file to write"),
+):
+    """Pre-encode the in-code catalog into a snapshot file workers can mmap"""
+    size = _build_snapshot(output)
+    typer.echo(f"Wrote {size} bytes to {output}")
+
+
+@cli.command("serve")
+def serve_command(
+    host: str = typer.Option("0.0.0.0", help="Interface to bind"),
+    port: int = typer.Option(8001, help="Port to bind"),
+    workers: int = typer.Option(
+        int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)), help="Worker processes"),
+    snapshot: Optional[Path] = typer.Option(
+        Path("catalog.snapshot"), help="Catalog snapshot to build and share with the workers"),
+    no_snapshot: bool = typer.Option(False, "--no-snapshot", help="Serve the catalog from Mongo only"),
+    backlog: int = typer.Option(2048, help="Listen socket backlog"),
+    keep_alive: int = typer.Option(5, help="Seconds to keep idle connections open"),
+    limit_concurrency: Optional[int] = typer.Option(
+        None, help="Per-worker cap on concurrent connections before answering 503"),
+    log_level: str = typer.Option("info"),
+):
+    """Run the API under uvicorn with N workers sharing one catalog snapshot"""
+    import uvicorn
+
+    # Workers size their Mongo pool from this (see mongo_config.pool_size_per_worker).
+    # The app module is never imported here: with one worker uvicorn imports it in
+    # this process, and its client must be sized for, and owned by, that worker.
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    if workers > 1:
+        # Each worker writes its metrics here and /metrics merges them all
+        metrics_dir = Path(os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+                           or Path(tempfile.gettempdir()) / f"setp-metrics-{port}")
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        # Totals from a previous run would otherwise be added to this one's
+        for stale in metrics_dir.glob("*.json"):
+            stale.unlink()
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = str(metrics_dir)
+    if not no_snapshot:
+        subprocess.run([sys.executable, __file__, "build-snapshot", str(snapshot)], check=True)
+        typer.echo(f"Catalog snapshot {snapshot} shared by {workers} workers")
+        os.environ['CATALOG_SNAPSHOT'] = str(snapshot.resolve())
+
+    uvicorn.run(
+        "server:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        backlog=backlog,
+        timeout_keep_alive=keep_alive,
+        limit_concurrency=limit_concurrency,
+        log_level=log_level,
+        # Access logs are the single biggest per-request cost; /metrics covers them
+        access_log=False,
+        proxy_headers=True,
+        app_dir=str(Path(__file__).parent),
+    )
+
+
+@cli.command("grade")
+def grade_command(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False,
+                                help="NDJSON file, one {module_id, answers, ...} object per line"),
+    batch_size: int = typer.Option(10000, help="Submissions graded per batch"),
+):
+    """Batch-grade submissions (imports, replays) without recording progress
+
+    Results are written to stdout as NDJSON, in input order, with any extra
+    input fields (such as user_id) passed through.
+    """
+    server = _server()
+    catalog = _run(server.catalog_cache.get())
+
+    with path.open() as lines:
+        while True:
+            rows = [json.loads(line) for line in islice(lines, batch_size) if line.strip()]
+            if not rows:
+                break
+            # Group by module so each answer key grades its submissions in one pass
+            by_module = {}
+            for i, row in enumerate(rows):
+                by_module.setdefault(row['module_id'], []).append(i)
+            results = [None] * len(rows)
+            for module_id, positions in by_module.items():
+                answer_key = catalog.answer_keys.get(module_id)
+                if answer_key is None:
+                    for i in positions:
+                        results[i] = {"error": "Assessment not found"}
+                    continue
+                scores = answer_key.grade_many(rows[i]['answers'] for i in positions)
+                for i, correct in zip(positions, scores):
+                    results[i] = result_for(correct, answer_key.total)
+            for row, result in zip(rows, results):
+                passthrough = {k: v for k, v in row.items() if k != 'answers'}
+                typer.echo(json.dumps({**passthrough, **result}))
+
+
+@cli.command("export-progress")
+def export_progress_command(
+    output: Path = typer.Argument(..., dir_okay=False, help="File to write"),
+    fmt: str = typer.Option(CSV, "--format", help="csv or parquet"),
+    batch_size: int = typer.Option(1000, help="Progress rows read and encoded per batch"),
+    completed_only: bool = typer.Option(False, "--completed-only", help="Only completed modules"),
+):
+    """Export every user's progress joined with user details (compliance report)"""
+    try:
+        check_format(fmt)
+    except (ValueError, ExportUnavailable) as exc:
+        raise typer.BadParameter(str(exc), param_hint="--format")
+    server = _server()
+
+    async def run():
+        written = 0
+        with output.open("wb") as out:
+            async for chunk in export_progress(server.db, fmt, batch_size=batch_size,
+                                               completed_only=completed_only):
+                out.write(chunk)
+                written += len(chunk)
+        return written
+
+    written = _run(run())
+    typer.echo(f"Wrote {written} bytes to {output}")
+
+
+if __name__ == "__main__":
+    cli()
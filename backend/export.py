@@ -0,0 +1,164 @@
+"""Streaming compliance export of progress joined with users.
+
+Progress is read through a cursor in bounded batches, each batch is joined
+with its users by one ``$in`` lookup and encoded on a worker thread, so memory
+stays constant in the number of rows and the event loop is never blocked by
+encoding.
+
+CSV cells that a spreadsheet would read as a formula (leading ``=``, ``+``,
+``-``, ``@``, tab or carriage return) are prefixed with ``'`` since user
+names are free text.
+"""
+import asyncio
+import csv
+import io
+from typing import Any, AsyncIterator, Dict, List
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # In requirements.txt; without it only CSV is available
+    pa = None
+    pq = None
+
+
+CSV = "csv"
+PARQUET = "parquet"
+FORMATS = (CSV, PARQUET)
+MEDIA_TYPES = {CSV: "text/csv", PARQUET: "application/vnd.apache.parquet"}
+
+# Leading characters that make spreadsheets evaluate a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+EXPORT_FIELDS = [
+    "user_id", "user_name", "user_role", "module_id",
+    "completed", "score", "total_questions", "completed_at",
+]
+
+
+class ExportUnavailable(Exception):
+    """Raised when the requested format needs a library that is not installed"""
+
+
+def check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(FORMATS)}")
+    if fmt == PARQUET and pa is None:
+        raise ExportUnavailable("Parquet export requires pyarrow")
+
+
+async def iter_progress_batches(db, batch_size: int = 1000,
+                                completed_only: bool = False) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield export rows in batches of at most ``batch_size``"""
+    query = {"completed": True} if completed_only else {}
+    cursor = db.progress.find(query, {"_id": 0}).batch_size(batch_size)
+    while True:
+        progress = await cursor.to_list(batch_size)
+        if not progress:
+            break
+        user_ids = list({p['user_id'] for p in progress})
+        users = await db.users.find(
+            {"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "name": 1, "role": 1}
+        ).to_list(None)
+        users_by_id = {u['id']: u for u in users}
+
+        rows = []
+        for p in progress:
+            user = users_by_id.get(p['user_id'], {})
+            rows.append({
+                "user_id": p['user_id'],
+                "user_name": user.get('name'),
+                "user_role": user.get('role'),
+                "module_id": p['module_id'],
+                "completed": p.get('completed'),
+                "score": p.get('score'),
+                "total_questions": p.get('total_questions'),
+                "completed_at": p.get('completed_at'),
+            })
+        yield rows
+
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _encode_csv(rows: List[Dict[str, Any]], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    if header:
+        writer.writeheader()
+    writer.writerows({k: _csv_cell(v) for k, v in row.items()} for row in rows)
+    return buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("user_id", pa.string()),
+        ("user_name", pa.string()),
+        ("user_role", pa.string()),
+        ("module_id", pa.string()),
+        ("completed", pa.bool_()),
+        ("score", pa.int64()),
+        ("total_questions", pa.int64()),
+        ("completed_at", pa.string()),
+    ])
+
+
+def _write_row_group(writer, rows: List[Dict[str, Any]], schema):
+    writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+
+async def export_progress(db, fmt: str = CSV, batch_size: int = 1000,
+                          completed_only: bool = False) -> AsyncIterator[bytes]:
+    """Yield the encoded export chunk by chunk (one chunk per batch)"""
+    check_format(fmt)
+    batches = iter_progress_batches(db, batch_size=batch_size, completed_only=completed_only)
+
+    if fmt == CSV:
+        header = True
+        async for rows in batches:
+            yield await asyncio.to_thread(_encode_csv, rows, header)
+            header = False
+        if header:
+            yield _encode_csv([], True)
+        return
+
+    # Parquet: one row group per batch, flushed to the caller as it is written
+    sink = _ChunkSink()
+    schema = _parquet_schema()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for rows in batches:
+            await asyncio.to_thread(_write_row_group, writer, rows, schema)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        await asyncio.to_thread(writer.close)
+    yield sink.drain()
@@ -0,0 +1,109 @@
+"""Declarative registry of the MongoDB indexes the API relies on.
+
+``ensure_indexes`` applies the registry at startup (``create_index`` is a
+no-op for an index that already exists) and ``check_indexes`` reports drift
+between the registry and what is actually in the database.
+"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from migrations import dedupe_progress
+
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+    # Called when a unique build fails on existing duplicates, then the build is retried
+    repair: Optional[Callable[[Any], Awaitable[Any]]] = None
+
+    @property
+    def name(self) -> str:
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", [("id", ASCENDING)], unique=True),
+    IndexSpec("modules", [("id", ASCENDING)], unique=True),
+    # Catalog loads sort by order, with id as the tiebreaker the summary cursor relies on
+    IndexSpec("modules", [("order", ASCENDING), ("id", ASCENDING)]),
+    IndexSpec("assessments", [("module_id", ASCENDING)], unique=True),
+    IndexSpec(
+        "progress",
+        [("user_id", ASCENDING), ("module_id", ASCENDING)],
+        unique=True,
+        repair=dedupe_progress,
+    ),
+    # Keyset pagination: each listing's sort key, ending in _id as the tiebreaker
+    IndexSpec("progress", [("module_id", ASCENDING), ("completed_at", DESCENDING), ("_id", DESCENDING)]),
+    IndexSpec("progress", [("completed_at", DESCENDING), ("_id", DESCENDING)]),
+    # Leaderboard sync: progress changed since a worker's last sync
+    IndexSpec("progress", [("updated_at", ASCENDING)]),
+    IndexSpec("feedback", [("module_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    # Item analysis reads one module's log for the current answer key
+    IndexSpec("attempt_log", [("module_id", ASCENDING), ("key", ASCENDING)]),
+    # Task queue recovery: pending jobs whose lease has lapsed
+    IndexSpec("outbox", [("status", ASCENDING), ("lease_until", ASCENDING)]),
+]
+
+
+def _selected(collections: Optional[Sequence[str]]) -> List[IndexSpec]:
+    if not collections:
+        return INDEXES
+    return [spec for spec in INDEXES if spec.collection in collections]
+
+
+async def ensure_indexes(db, collections: Optional[Sequence[str]] = None):
+    """Create every registered index that does not exist yet"""
+    for spec in _selected(collections):
+        started = time.perf_counter()
+        try:
+            await db[spec.collection].create_index(spec.keys, unique=spec.unique, name=spec.name)
+        except OperationFailure as exc:
+            # 11000: existing duplicates block a unique build
+            if exc.code != 11000 or spec.repair is None:
+                raise
+            logger.warning(f"Duplicates block index {spec.collection}.{spec.name}, repairing")
+            await spec.repair(db)
+            await db[spec.collection].create_index(spec.keys, unique=spec.unique, name=spec.name)
+        logger.info(
+            f"Index {spec.collection}.{spec.name} ready in "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+
+
+async def check_indexes(db) -> Dict[str, List[str]]:
+    """Compare the registry with the database
+
+    Returns ``missing`` (registered but absent), ``mismatched`` (present under
+    the registered name with different keys or uniqueness) and ``unexpected``
+    (present in a registered collection but not in the registry).
+    """
+    drift: Dict[str, List[str]] = {"missing": [], "mismatched": [], "unexpected": []}
+    by_collection: Dict[str, List[IndexSpec]] = {}
+    for spec in INDEXES:
+        by_collection.setdefault(spec.collection, []).append(spec)
+
+    for collection, specs in by_collection.items():
+        existing = await db[collection].index_information()
+        for spec in specs:
+            info = existing.get(spec.name)
+            if info is None:
+                drift["missing"].append(f"{collection}.{spec.name}")
+                continue
+            keys = [(field, int(direction)) for field, direction in info['key']]
+            if keys != spec.keys or bool(info.get('unique')) != spec.unique:
+                drift["mismatched"].append(f"{collection}.{spec.name}")
+
+        registered = {spec.name for spec in specs} | {"_id_"}
+        drift["unexpected"].extend(
+            f"{collection}.{name}" for name in existing if name not in registered
+        )
+    return drift
@@ -0,0 +1,202 @@
+"""Classical item analysis over the append-only assessment answer log.
+
+Every graded submission appends one small document to ``db.attempt_log``:
+the questions it was shown (bank indices as packed uint16, omitted when it
+was the whole bank in order), a packed bitmask of the correctly answered
+ones (see ``AnswerKey.packed_mask``) and the chosen option index for each,
+one byte apiece (see ``AnswerKey.choices``).
+Analysis flattens a module's log for the current answer key into one row
+per (attempt, question shown) and computes, for every question at once with
+``bincount`` sums, so the cost is linear in what was answered however large
+the question bank is:
+
+- p-value: the share of attempts that answered correctly (difficulty)
+- discrimination: point-biserial correlation between answering correctly
+  and the score on the *other* questions, so an item does not correlate
+  with itself
+- per option: the selection rate, and the point-biserial correlation
+  between choosing it and the total score; a distractor that correlates
+  positively is drawing the stronger candidates and is likely misleading
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from scoring import NO_ANSWER, AnswerKey
+
+
+EASY_P_VALUE = 0.9
+HARD_P_VALUE = 0.3
+MIN_DISCRIMINATION = 0.2
+MIN_DISTRACTOR_RATE = 0.05
+# Below this many attempts at a question its statistics are reported but not flagged
+MIN_ATTEMPTS_FOR_FLAGS = 20
+
+
+def _packed(mask, count: int) -> bytes:
+    # Entries and jobs written before the mask was packed hold it as an int
+    if isinstance(mask, int):
+        return mask.to_bytes((count + 7) // 8, "little")
+    return bytes(mask)
+
+
+def log_entry(attempt_id: str, user_id: str, module_id: str, answer_key: str, mask,
+              choices: bytes, completed_at: str, questions: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+    """Answer log document; ``answer_key`` is the ``AnswerKey.fingerprint`` it was graded with"""
+    entry = {
+        "_id": attempt_id,
+        "module_id": module_id,
+        "key": answer_key,
+        "user_id": user_id,
+        "mask": _packed(mask, len(choices)),
+        "choices": choices,
+        "at": completed_at,
+    }
+    if questions is not None:
+        entry["questions"] = np.asarray(questions, dtype="<u2").tobytes()
+    return entry
+
+
+class Responses(NamedTuple):
+    """One element per (attempt, question shown)"""
+    attempt: np.ndarray
+    question: np.ndarray
+    choice: np.ndarray
+    correct: np.ndarray
+
+
+async def load_responses(db, answer_key: AnswerKey) -> Responses:
+    """Flatten the module's answer log for the current key"""
+    masks = bytearray()
+    lengths: List[int] = []
+    questions: List[np.ndarray] = []
+    choices = bytearray()
+    whole_bank = np.arange(answer_key.total, dtype=np.int64)
+    cursor = db.attempt_log.find(
+        {"module_id": answer_key.module_id, "key": answer_key.fingerprint},
+        {"_id": 0, "mask": 1, "choices": 1, "questions": 1},
+    )
+    async for doc in cursor:
+        shown = doc.get('questions')
+        questions.append(whole_bank if shown is None else np.frombuffer(shown, dtype="<u2").astype(np.int64))
+        lengths.append(len(doc['choices']))
+        masks += _packed(doc['mask'], lengths[-1])
+        choices += doc['choices']
+
+    counts = np.array(lengths, dtype=np.int64)
+    attempt = np.repeat(np.arange(len(counts)), counts)
+    # Position of each response within its attempt, i.e. its bit in that attempt's mask
+    position = np.arange(len(attempt)) - np.repeat(np.cumsum(counts) - counts, counts)
+    mask_bytes = (counts + 7) // 8
+    bits = np.unpackbits(np.frombuffer(bytes(masks), dtype=np.uint8), bitorder="little")
+    correct = bits[(np.cumsum(mask_bytes) - mask_bytes)[attempt] * 8 + position]
+    return Responses(
+        attempt,
+        np.concatenate(questions) if questions else np.zeros(0, dtype=np.int64),
+        np.frombuffer(bytes(choices), dtype=np.uint8),
+        correct.astype(np.float64),
+    )
+
+
+def _per_question_correlation(question: np.ndarray, x: np.ndarray, y: np.ndarray,
+                              size: int) -> np.ndarray:
+    """Pearson correlation of ``x`` and ``y`` within each question, from grouped sums"""
+    def total(weights):
+        return np.bincount(question, weights=weights, minlength=size)
+
+    n = np.bincount(question, minlength=size)
+    sx, sy = total(x), total(y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = total(x * y) - sx * sy / n
+        variance = (total(x * x) - sx * sx / n) * (total(y * y) - sy * sy / n)
+        return np.where(variance > 1e-12, covariance / np.sqrt(np.maximum(variance, 1e-12)), np.nan)
+
+
+def _number(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _statistics(responses: Responses, questions: int, width: int) -> Tuple[np.ndarray, ...]:
+    attempt, question, choice, correct = responses
+    # Option slots per question: the options, then "other" and "no answer"
+    slots = width + 2
+    totals = np.bincount(attempt, weights=correct)[attempt] if len(attempt) else correct
+    shown = np.bincount(question, minlength=questions).astype(np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_values = np.bincount(question, weights=correct, minlength=questions) / shown
+        discrimination = _per_question_correlation(question, correct, totals - correct, questions)
+
+        # Anything that is neither an option nor "no answer" counts as "other"
+        codes = np.where(choice < width, choice, np.where(choice == NO_ANSWER, width + 1, width))
+        slot = question * slots + codes
+        counts = np.bincount(slot, minlength=questions * slots).reshape(questions, slots)
+        score_sums = np.bincount(slot, weights=totals, minlength=questions * slots).reshape(questions, slots)
+        rates = counts / shown[:, None]
+
+        # Point-biserial of choosing the option: (M1 - M) / s * sqrt(p / (1 - p)),
+        # with M and s taken over the attempts that were shown the question
+        mean = np.bincount(question, weights=totals, minlength=questions) / shown
+        spread = np.sqrt(np.maximum(
+            np.bincount(question, weights=totals * totals, minlength=questions) / shown - mean * mean, 0
+        ))
+        option_discrimination = np.where(
+            (counts > 0) & (counts < shown[:, None]) & (spread[:, None] > 1e-9),
+            (score_sums / np.maximum(counts, 1) - mean[:, None]) / np.where(spread > 1e-9, spread, 1)[:, None]
+            * np.sqrt(rates / (1 - rates)),
+            np.nan,
+        )
+    return shown, p_values, discrimination, rates, option_discrimination
+
+
+def analyze(assessment: Dict[str, Any], answer_key: AnswerKey, responses: Responses) -> Dict[str, Any]:
+    """Difficulty, discrimination and option statistics for every question in the bank"""
+    questions = answer_key.total
+    width = max((len(q.get('options') or []) for q in assessment['questions']), default=0)
+    shown, p_values, discrimination, rates, option_discrimination = _statistics(responses, questions, width)
+    attempts = int(responses.attempt.max()) + 1 if len(responses.attempt) else 0
+
+    report = []
+    for j, question in enumerate(assessment['questions']):
+        options = question.get('options') or []
+        correct_option = answer_key.correct_options[j]
+        option_stats = [
+            {
+                "option": option,
+                "correct": i == correct_option,
+                "selection_rate": _number(rates[j, i]),
+                "discrimination": _number(option_discrimination[j, i]),
+            }
+            for i, option in enumerate(options)
+        ]
+        flags = []
+        if shown[j] >= MIN_ATTEMPTS_FOR_FLAGS:
+            if p_values[j] >= EASY_P_VALUE:
+                flags.append("too_easy")
+            if p_values[j] <= HARD_P_VALUE:
+                flags.append("too_hard")
+            if np.isnan(discrimination[j]) or discrimination[j] < MIN_DISCRIMINATION:
+                flags.append("low_discrimination")
+            if any(
+                not o['correct'] and (o['selection_rate'] or 0) >= MIN_DISTRACTOR_RATE
+                and (o['discrimination'] or 0) > 0
+                for o in option_stats
+            ):
+                flags.append("misleading_distractor")
+        report.append({
+            "question_id": question['id'],
+            "question": question['question'],
+            "attempts": int(shown[j]),
+            "p_value": _number(p_values[j]),
+            "discrimination": _number(discrimination[j]),
+            "other_rate": _number(rates[j, width]),
+            "unanswered_rate": _number(rates[j, width + 1]),
+            "options": option_stats,
+            "flags": flags,
+        })
+    return {
+        "module_id": answer_key.module_id,
+        "answer_key": answer_key.fingerprint,
+        "attempts": attempts,
+        "questions": report,
+    }
@@ -0,0 +1,397 @@
+"""In-memory leaderboard ranked by total best score, then by who got there first.
+
+Each worker keeps every user's best score per module and one indexable skip
+list per cohort (everyone, plus one per role). Submissions update it in
+O(log n); top-K and rank-of-user queries are O(log n + K) with no database
+access. The structure is built from ``db.progress`` once at startup. After
+that, every ``refresh_interval`` seconds each worker folds in the progress
+rows whose ``updated_at`` (set by ``save_progress``) is recent, which brings
+in submissions graded by other workers at the cost of an index range scan.
+Replaying a row is harmless since only a better score changes a standing.
+A full rebuild only happens when the leaderboard version in ``db.meta`` is
+bumped by something that rewrites progress outside the write path, such as
+the progress de-duplication migration.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+
+logger = logging.getLogger(__name__)
+
+ALL = "all"
+MAX_LEVEL = 32
+LEADERBOARD_META_ID = "leaderboard"
+# Rows are re-read for this long after a sync, covering clock skew between
+# workers and writes that were stamped just before the previous sync
+SYNC_OVERLAP = timedelta(seconds=30)
+PROGRESS_FIELDS = {"_id": 0, "user_id": 1, "module_id": 1, "score": 1, "completed": 1, "completed_at": 1}
+
+
+async def get_leaderboard_version(db) -> int:
+    """Read the leaderboard version counter (0 if never set)"""
+    doc = await db.meta.find_one({"_id": LEADERBOARD_META_ID}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+async def bump_leaderboard_version(db) -> int:
+    """Make every worker rebuild its leaderboard from scratch on its next sync"""
+    doc = await db.meta.find_one_and_update(
+        {"_id": LEADERBOARD_META_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # Number of bottom-level steps each link skips
+        self.width: List[int] = [1] * level
+
+
+class RankedSet:
+    """Indexable skip list: insert, remove, rank and nth in O(log n)
+
+    Keys must be unique and totally ordered.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self._head = _Node(None, MAX_LEVEL)
+        self._size = 0
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def _predecessors(self, key) -> Tuple[List[_Node], List[int]]:
+        """Last node before ``key`` on every level and its bottom-level position"""
+        chain: List[_Node] = [self._head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node, position = self._head, 0
+        for level in reversed(range(MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, key):
+        chain, positions = self._predecessors(key)
+        new = _Node(key, self._level())
+        # Position of the new node on the bottom level
+        position = positions[0] + 1
+        for level in range(len(new.next)):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            skipped = position - positions[level]
+            new.width[level] = prev.width[level] - skipped + 1
+            prev.width[level] = skipped
+        for level in range(len(new.next), MAX_LEVEL):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain, _ = self._predecessors(key)
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key) -> int:
+        """0-based position of ``key``"""
+        chain, positions = self._predecessors(key)
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        return positions[0]
+
+    def _node_at(self, index: int) -> _Node:
+        node, remaining = self._head, index + 1
+        for level in reversed(range(MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def slice(self, start: int, count: int) -> Iterator[Any]:
+        """Keys at positions ``start`` to ``start + count - 1``"""
+        if start >= self._size or count <= 0:
+            return
+        node = self._node_at(start)
+        while node is not None and count > 0:
+            yield node.key
+            node = node.next[0]
+            count -= 1
+
+
+class _Standing:
+    __slots__ = ("user_id", "name", "role", "modules", "total_score", "completed", "reached_at")
+
+    def __init__(self, user_id: str, name: Optional[str], role: Optional[str]):
+        self.user_id = user_id
+        self.name = name
+        self.role = role
+        self.modules: Dict[str, Tuple[int, bool, str]] = {}
+        self.total_score = 0
+        self.completed = 0
+        self.reached_at = ""
+
+    @property
+    def key(self) -> Tuple[int, str, str]:
+        # Higher score first; on a tie whoever reached it earlier
+        return (-self.total_score, self.reached_at, self.user_id)
+
+    def improve(self, module_id: str, score: int, completed: bool, completed_at: str) -> bool:
+        """Apply an attempt with the same best-score rule as ``save_progress``"""
+        best = self.modules.get(module_id)
+        if best is not None and best[0] >= score:
+            return False
+        if best is not None:
+            self.total_score -= best[0]
+            self.completed -= best[1]
+        self.modules[module_id] = (score, completed, completed_at)
+        self.total_score += score
+        self.completed += completed
+        self.reached_at = max(self.reached_at, completed_at or "")
+        return True
+
+    def entry(self, rank: int) -> Dict[str, Any]:
+        return {
+            "rank": rank + 1,
+            "user_id": self.user_id,
+            "name": self.name,
+            "role": self.role,
+            "total_score": self.total_score,
+            "completed_modules": self.completed,
+        }
+
+
+class _Board:
+    """Standings plus one ranked set and running totals per cohort"""
+
+    def __init__(self):
+        self.standings: Dict[str, _Standing] = {}
+        self.ranked: Dict[str, RankedSet] = {ALL: RankedSet()}
+        self.totals: Dict[str, List[int]] = {ALL: [0, 0]}  # [score sum, completed sum]
+
+    def _cohorts(self, standing: _Standing) -> List[str]:
+        return [ALL, standing.role] if standing.role else [ALL]
+
+    def _detach(self, standing: _Standing):
+        for cohort in self._cohorts(standing):
+            self.ranked[cohort].remove(standing.key)
+            totals = self.totals[cohort]
+            totals[0] -= standing.total_score
+            totals[1] -= standing.completed
+
+    def _attach(self, standing: _Standing):
+        for cohort in self._cohorts(standing):
+            self.ranked.setdefault(cohort, RankedSet()).insert(standing.key)
+            totals = self.totals.setdefault(cohort, [0, 0])
+            totals[0] += standing.total_score
+            totals[1] += standing.completed
+
+    def record(self, user_id: str, name: Optional[str], role: Optional[str], module_id: str,
+               score: int, completed: bool, completed_at: str):
+        standing = self.standings.get(user_id)
+        if standing is None:
+            standing = self.standings[user_id] = _Standing(user_id, name, role)
+        else:
+            best = standing.modules.get(module_id)
+            if best is not None and best[0] >= score:
+                return
+            self._detach(standing)
+        standing.improve(module_id, score, completed, completed_at)
+        self._attach(standing)
+
+
+def _attempt(doc: Dict[str, Any], name: Optional[str], role: Optional[str]) -> tuple:
+    return (
+        doc['user_id'], name, role, doc['module_id'], doc.get('score') or 0,
+        bool(doc.get('completed')), doc.get('completed_at') or "",
+    )
+
+
+class Leaderboard:
+    """Per-worker leaderboard kept in step with ``db.progress``"""
+
+    def __init__(self, db, refresh_interval: float = 5.0):
+        self._db = db
+        self.refresh_interval = refresh_interval
+        self._board = _Board()
+        self._users: Dict[str, Tuple[Optional[str], Optional[str]]] = {}  # id -> (name, role)
+        # Attempts recorded while a rebuild is reading Mongo, replayed onto the new board
+        self._pending: Optional[List[tuple]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._version: Optional[int] = None
+        # Rows updated at or after this time (less SYNC_OVERLAP) are read on the next sync
+        self._synced_at: Optional[datetime] = None
+        self.rebuilds = 0
+        self.last_rebuild_ms = 0.0
+        self.syncs = 0
+        self.synced_rows = 0
+
+    def register_user(self, user_id: str, name: str, role: str):
+        self._users[user_id] = (name, role)
+
+    async def _user(self, user_id: str) -> Tuple[Optional[str], Optional[str]]:
+        if user_id not in self._users:
+            # A user created on another worker since the last rebuild
+            doc = await self._db.users.find_one({"id": user_id}, {"_id": 0, "name": 1, "role": 1})
+            self._users[user_id] = (doc.get("name"), doc.get("role")) if doc else (None, None)
+        return self._users[user_id]
+
+    async def record(self, user_id: str, module_id: str, score: int, completed: bool, completed_at: str):
+        """Fold a graded attempt into the leaderboard"""
+        name, role = await self._user(user_id)
+        attempt = (user_id, name, role, module_id, score, completed, completed_at)
+        self._board.record(*attempt)
+        if self._pending is not None:
+            self._pending.append(attempt)
+
+    async def rebuild(self):
+        """Recompute every standing from ``db.progress`` and swap it in"""
+        started = time.perf_counter()
+        # Read before the scan, so changes made during it are picked up by the next sync
+        version = await get_leaderboard_version(self._db)
+        synced_at = datetime.now(timezone.utc)
+        self._pending = []
+        try:
+            users: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+            async for doc in self._db.users.find({}, {"_id": 0, "id": 1, "name": 1, "role": 1}):
+                users[doc['id']] = (doc.get('name'), doc.get('role'))
+
+            board = _Board()
+            async for doc in self._db.progress.find({}, PROGRESS_FIELDS):
+                name, role = users.get(doc['user_id'], (None, None))
+                board.record(*_attempt(doc, name, role))
+            for attempt in self._pending:
+                board.record(*attempt)
+            self._users.update(users)
+            self._board = board
+            self._version = version
+            self._synced_at = synced_at
+        finally:
+            self._pending = None
+        self.rebuilds += 1
+        self.last_rebuild_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Leaderboard rebuilt with {len(board.standings)} users in {self.last_rebuild_ms:.1f} ms"
+        )
+
+    async def sync(self):
+        """Fold in progress updated by any worker since the last sync
+
+        Rebuilds instead when the leaderboard version has moved on.
+        """
+        version = await get_leaderboard_version(self._db)
+        if self._synced_at is None or version != self._version:
+            await self.rebuild()
+            return
+        synced_at = datetime.now(timezone.utc)
+        rows = await self._db.progress.find(
+            {"updated_at": {"$gte": self._synced_at - SYNC_OVERLAP}}, PROGRESS_FIELDS
+        ).to_list(None)
+        unknown = list({row['user_id'] for row in rows} - self._users.keys())
+        if unknown:
+            async for doc in self._db.users.find({"id": {"$in": unknown}}, {"_id": 0, "id": 1, "name": 1, "role": 1}):
+                self._users[doc['id']] = (doc.get('name'), doc.get('role'))
+        for row in rows:
+            name, role = self._users.get(row['user_id'], (None, None))
+            self._board.record(*_attempt(row, name, role))
+        self._synced_at = synced_at
+        self.syncs += 1
+        self.synced_rows += len(rows)
+
+    def top(self, limit: int = 10, offset: int = 0, cohort: str = ALL) -> List[Dict[str, Any]]:
+        board = self._board
+        ranked = board.ranked.get(cohort)
+        if ranked is None:
+            return []
+        return [
+            board.standings[key[2]].entry(offset + i)
+            for i, key in enumerate(ranked.slice(offset, limit))
+        ]
+
+    def rank_of(self, user_id: str, cohort: str = ALL) -> Optional[Dict[str, Any]]:
+        board = self._board
+        standing = board.standings.get(user_id)
+        ranked = board.ranked.get(cohort)
+        if standing is None or ranked is None or cohort not in board._cohorts(standing):
+            return None
+        entry = standing.entry(ranked.rank(standing.key))
+        entry["out_of"] = len(ranked)
+        return entry
+
+    def size(self, cohort: str = ALL) -> int:
+        ranked = self._board.ranked.get(cohort)
+        return len(ranked) if ranked is not None else 0
+
+    def cohorts(self) -> List[Dict[str, Any]]:
+        board = self._board
+        stats = []
+        for cohort, ranked in sorted(board.ranked.items()):
+            users = len(ranked)
+            score_sum, completed_sum = board.totals[cohort]
+            stats.append({
+                "cohort": cohort,
+                "users": users,
+                "average_total_score": round(score_sum / users, 2) if users else 0.0,
+                "average_completed_modules": round(completed_sum / users, 2) if users else 0.0,
+            })
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._board.standings),
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": round(self.last_rebuild_ms, 1),
+            "syncs": self.syncs,
+            "synced_rows": self.synced_rows,
+        }
+
+    def start(self):
+        if self._task is None and self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Leaderboard sync failed")
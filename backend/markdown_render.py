@@ -0,0 +1,65 @@
+"""Server-side Markdown rendering for module content.
+
+Module content is rendered to HTML once per catalog version and split into
+sections at its top-level headings, so the client can show the first
+sections right away and fetch the rest lazily.
+
+Rendering follows CommonMark (like ``react-markdown`` on the client) with raw
+HTML disabled: any HTML in the source is escaped rather than passed through,
+and markdown-it's link validation drops ``javascript:``, ``vbscript:``,
+``file:`` and non-image ``data:`` URLs, so the output is safe to inject.
+"""
+from typing import List, NamedTuple
+
+from markdown_it import MarkdownIt
+
+
+_markdown = MarkdownIt("commonmark", {"html": False})
+
+
+class Section(NamedTuple):
+    title: str
+    html: str
+
+
+def _is_split_point(token, tag: str) -> bool:
+    # Only document-level headings: one nested in a list or blockquote would
+    # leave that container's tags unbalanced across two sections
+    return token.type == "heading_open" and token.tag == tag and token.level == 0
+
+
+def _split_level(tokens) -> str:
+    """Heading tag to split on: the highest level used more than once (h1/h2)"""
+    levels = [t.tag for t in tokens if t.type == "heading_open" and t.level == 0]
+    for tag in ("h1", "h2"):
+        if levels.count(tag) > 1:
+            return tag
+    return ""
+
+
+def render_sections(markdown: str) -> List[Section]:
+    """Render Markdown to sanitized HTML, one section per top-level heading
+
+    Anything before the first heading (an intro or a rule) stays with the
+    first section. Content without repeated top-level headings is a single
+    untitled section.
+    """
+    env: dict = {}
+    tokens = _markdown.parse(markdown or "", env)
+    tag = _split_level(tokens)
+
+    starts = [i for i, t in enumerate(tokens) if tag and _is_split_point(t, tag)]
+    # The intro before the first heading belongs to the first section
+    starts = [0] + starts[1:]
+    bounds = zip(starts, starts[1:] + [len(tokens)])
+
+    sections = []
+    for start, end in bounds:
+        chunk = tokens[start:end]
+        title = ""
+        for i, token in enumerate(chunk[:-1]):
+            if _is_split_point(token, tag):
+                title = chunk[i + 1].content.strip()
+                break
+        sections.append(Section(title, _markdown.renderer.render(chunk, _markdown.options, env)))
+    return sections
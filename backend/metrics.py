@@ -0,0 +1,490 @@
+"""Request and MongoDB instrumentation exposed in Prometheus text format.
+
+``MetricsMiddleware`` records per-route latency, status codes and in-flight
+requests. ``InstrumentedDatabase`` wraps the Motor database so that every
+operation is timed per collection and operation, and also charged to the
+request that issued it (``http_request_mongo_seconds``), which shows whether
+a slow route is waiting on Mongo or busy in Python.
+
+Every worker process keeps its own registry. With ``PROMETHEUS_MULTIPROC_DIR``
+set (``cli.py serve`` sets it for multi-worker runs), ``MultiProcessStore``
+writes each worker's values to ``<dir>/<pid>.json`` every second and a
+scrape merges the files of every worker. Counters and histograms are summed
+and keep the totals of workers that have exited, so rates do not depend on
+which worker answered. Gauges are per-worker state, so they get a ``pid``
+label and only live workers are reported.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(value)}"
+            for values, value in sorted(self._values.items())
+        ]
+
+    def snapshot(self) -> List[Any]:
+        return [[list(values), value] for values, value in self._values.items()]
+
+    def merge(self, series: List[Any], extra: LabelValues = ()):
+        for values, value in series:
+            self.inc(*values, *extra, amount=value)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labelvalues: str, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues: str, value: float):
+        self._values[labelvalues] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: non-cumulative bucket counts (last slot is +Inf), sum
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, *labelvalues: str, value: float):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+    def snapshot(self) -> List[Any]:
+        return [[list(values), counts, total] for values, (counts, total) in self._series.items()]
+
+    def merge(self, series: List[Any], extra: LabelValues = ()):
+        for values, counts, total in series:
+            key = tuple(values) + extra
+            merged = self._series.get(key)
+            if merged is None:
+                merged = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Iterable[_Metric]]):
+        """Register a callback producing metrics at scrape time (e.g. queue depth)"""
+        self._collectors.append(collect)
+
+    def collect(self) -> Iterable[_Metric]:
+        yield from self._metrics
+        for collect in self._collectors:
+            yield from collect()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.collect():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MultiProcessStore:
+    """Per-worker metric files in a shared directory, merged at scrape time"""
+
+    KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+    def __init__(self, registry: Registry, directory: Path, interval: float = 1.0):
+        self.registry = registry
+        self.directory = Path(directory)
+        self.interval = interval
+        self.pid = os.getpid()
+        self._task: Optional[asyncio.Task] = None
+
+    def _snapshot(self) -> bytes:
+        metrics = []
+        for metric in self.registry.collect():
+            entry = {
+                "name": metric.name, "documentation": metric.documentation, "kind": metric.kind,
+                "labelnames": list(metric.labelnames), "series": metric.snapshot(),
+            }
+            if isinstance(metric, Histogram):
+                entry["buckets"] = list(metric.buckets)
+            metrics.append(entry)
+        return json.dumps({"pid": self.pid, "metrics": metrics}).encode()
+
+    def _write(self, data: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.pid}.json"
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def flush(self):
+        """Write this worker's current values (call from the event loop thread)"""
+        self._write(self._snapshot())
+
+    async def render(self) -> str:
+        """Prometheus text for every worker that has written to the directory"""
+        # Values are read on the loop thread, the file work happens off it
+        return await asyncio.to_thread(self._merge, self._snapshot())
+
+    def _merge(self, own: bytes) -> str:
+        self._write(own)
+        merged: Dict[str, _Metric] = {}
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                data = json.loads(path.read_bytes())
+            except (OSError, ValueError):
+                # Removed or rewritten by another process mid-read; it will be back next scrape
+                continue
+            pid = data["pid"]
+            alive = pid == self.pid or _pid_alive(pid)
+            for entry in data["metrics"]:
+                gauge = entry["kind"] == "gauge"
+                if gauge and not alive:
+                    continue
+                metric = merged.get(entry["name"])
+                if metric is None:
+                    labelnames = entry["labelnames"] + (["pid"] if gauge else [])
+                    cls = self.KINDS[entry["kind"]]
+                    if cls is Histogram:
+                        metric = Histogram(entry["name"], entry["documentation"], labelnames, entry["buckets"])
+                    else:
+                        metric = cls(entry["name"], entry["documentation"], labelnames)
+                    merged[entry["name"]] = metric
+                metric.merge(entry["series"], (str(pid),) if gauge else ())
+        lines: List[str] = []
+        for metric in merged.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Final totals, so the counters of a worker that exits are not lost
+        self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self._write, self._snapshot())
+            except Exception:
+                logger.exception("Writing worker metrics failed")
+
+
+def gauges_from(prefix: str, documentation: str, values: Dict[str, Any]) -> List[Gauge]:
+    """Turn a flat stats dict into one gauge per numeric entry"""
+    gauges = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        gauge = Gauge(f"{prefix}_{key}", f"{documentation} ({key})")
+        gauge.set(value=value)
+        gauges.append(gauge)
+    return gauges
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+http_mongo_time = registry.register(Histogram(
+    "http_request_mongo_seconds", "Time a request spent waiting on MongoDB", ("method", "route"),
+    buckets=MONGO_BUCKETS))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",)))
+mongo_latency = registry.register(Histogram(
+    "mongo_operation_duration_seconds", "MongoDB operation latency", ("collection", "operation"),
+    buckets=MONGO_BUCKETS))
+mongo_errors = registry.register(Counter(
+    "mongo_operation_errors_total", "MongoDB operations that raised", ("collection", "operation")))
+
+# Mongo time accumulated by the request currently being served
+_request_mongo_seconds: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "request_mongo_seconds", default=None)
+
+
+def request_mongo_seconds() -> Optional[float]:
+    """Mongo time charged so far to the request being served, if any"""
+    accumulator = _request_mongo_seconds.get()
+    return accumulator[0] if accumulator is not None else None
+
+
+def _record_mongo(collection: str, operation: str, seconds: float, failed: bool = False):
+    mongo_latency.observe(collection, operation, value=seconds)
+    if failed:
+        mongo_errors.inc(collection, operation)
+    accumulator = _request_mongo_seconds.get()
+    if accumulator is not None:
+        accumulator[0] += seconds
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight gauges per route"""
+
+    def __init__(self, app: ASGIApp, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        accumulator = [0.0]
+        token = _request_mongo_seconds.set(accumulator)
+        http_in_flight.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec(method)
+            _request_mongo_seconds.reset(token)
+            # The router stores the matched route in the scope; label by its
+            # template so that path parameters do not explode cardinality
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "<unmatched>"
+            http_requests.inc(method, route_path, status)
+            http_latency.observe(method, route_path, value=elapsed)
+            http_mongo_time.observe(method, route_path, value=accumulator[0])
+
+
+TIMED_METHODS = frozenset({
+    "find_one", "insert_one", "insert_many", "replace_one", "update_one", "update_many",
+    "delete_one", "delete_many", "count_documents", "estimated_document_count", "distinct",
+    "find_one_and_update", "find_one_and_replace", "find_one_and_delete", "bulk_write",
+    "create_index", "create_indexes", "drop_index", "index_information",
+})
+CURSOR_METHODS = frozenset({"find", "aggregate"})
+
+
+class InstrumentedCursor:
+    """Cursor wrapper timing every fetch; chaining methods keep the wrapper"""
+
+    CHAIN_METHODS = frozenset({
+        "sort", "skip", "limit", "batch_size", "hint", "max_time_ms", "collation",
+        "comment", "allow_disk_use", "where",
+    })
+
+    def __init__(self, cursor, collection: str, operation: str):
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._cursor, name)
+        if name in self.CHAIN_METHODS:
+            def chain(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chain
+        return attr
+
+    async def to_list(self, *args, **kwargs):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await self._cursor.to_list(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _record_mongo(self._collection, self._operation, time.perf_counter() - started, failed)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await self._cursor.__anext__()
+        except StopAsyncIteration:
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Most documents come from the local batch; only charge real fetches
+            elapsed = time.perf_counter() - started
+            if failed or elapsed > 0.0001:
+                _record_mongo(self._collection, self._operation, elapsed, failed)
+
+
+class InstrumentedCollection:
+    """Collection wrapper timing every operation by collection and operation name"""
+
+    def __init__(self, collection, name: str):
+        self._collection = collection
+        self._name = name
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._collection, name)
+        if name in TIMED_METHODS:
+            wrapper = self._timed(name, attr)
+        elif name in CURSOR_METHODS:
+            def wrapper(*args, **kwargs):
+                return InstrumentedCursor(attr(*args, **kwargs), self._name, name)
+        elif hasattr(attr, "find_one"):
+            # Dotted sub-collection, e.g. db.feedback.archive
+            wrapper = InstrumentedCollection(attr, f"{self._name}.{name}")
+        else:
+            return attr
+        # Cache on the instance so the wrapper is built once per method
+        self.__dict__[name] = wrapper
+        return wrapper
+
+    def __getitem__(self, name: str):
+        return getattr(self, name)
+
+    def with_options(self, *args, **kwargs):
+        return InstrumentedCollection(self._collection.with_options(*args, **kwargs), self._name)
+
+    def _timed(self, operation: str, method):
+        collection = self._name
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _record_mongo(collection, operation, time.perf_counter() - started, failed)
+        return timed
+
+
+class InstrumentedDatabase:
+    """Database wrapper handing out instrumented collections"""
+
+    def __init__(self, database):
+        self._database = database
+        self._collections: Dict[str, InstrumentedCollection] = {}
+
+    def __getitem__(self, name: str) -> InstrumentedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = InstrumentedCollection(self._database[name], name)
+        return collection
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._database, name)
+        if hasattr(attr, "find_one"):
+            return self[name]
+        return attr
+
+    def with_options(self, *args, **kwargs):
+        return InstrumentedDatabase(self._database.with_options(*args, **kwargs))
@@ -0,0 +1,47 @@
+"""Data migrations that need to run against an existing database.
+
+Each migration is idempotent so it is safe to run again (or from several
+workers at once).
+"""
+import logging
+from typing import Dict
+
+from leaderboard import bump_leaderboard_version
+
+
+logger = logging.getLogger(__name__)
+
+
+async def dedupe_progress(db, dry_run: bool = False) -> Dict[str, int]:
+    """Collapse duplicate (user_id, module_id) progress rows into one
+
+    The row with the best score is kept; on a tie the earliest completion
+    wins, matching the "update only if the new score is better" rule.
+    """
+    pipeline = [
+        {"$sort": {"score": -1, "completed_at": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "module_id": "$module_id"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    groups = 0
+    removed = 0
+    async for group in db.progress.aggregate(pipeline, allowDiskUse=True):
+        groups += 1
+        stale = group['ids'][1:]
+        removed += len(stale)
+        if not dry_run:
+            await db.progress.delete_many({"_id": {"$in": stale}})
+    if removed and not dry_run:
+        # Rows went away without passing through save_progress
+        await bump_leaderboard_version(db)
+
+    logger.info(
+        "Progress de-duplication: %d duplicated pairs, %d rows %s",
+        groups, removed, "would be removed" if dry_run else "removed",
+    )
+    return {"duplicated_pairs": groups, "removed": removed}
+
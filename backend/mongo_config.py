@@ -0,0 +1,194 @@
+"""MongoDB client settings and connection pool monitoring.
+
+Client options are read from the environment once at startup. The pool is
+sized per worker: ``MONGO_POOL_BUDGET`` connections are shared between the
+worker processes unless ``MONGO_MAX_POOL_SIZE`` pins the size explicitly.
+The worker count comes from ``WEB_CONCURRENCY``, which must be set before the
+app is imported; ``cli.py serve`` does this. Under a bare ``uvicorn --workers N``
+or ``gunicorn -w N`` it is read from the command line the workers inherit, and
+any other launcher has to export ``WEB_CONCURRENCY`` or every worker gets the
+whole budget. Checkouts wait at most ``MONGO_WAIT_QUEUE_TIMEOUT_MS`` so an
+exhausted pool fails fast instead of piling up requests.
+
+``PoolMonitor`` follows pool events to report how saturated the pool is,
+which ``/readyz`` uses to take a worker out of rotation.
+"""
+import importlib.util
+import os
+import sys
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+from pymongo.read_preferences import ReadPreference
+
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Wire compressors in order of preference, with the module pymongo needs for each
+COMPRESSOR_MODULES = (("zstd", "zstandard"), ("snappy", "snappy"), ("zlib", "zlib"))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def available_compressors(requested: List[str]) -> List[str]:
+    """Keep the requested compressors whose libraries are installed"""
+    modules = dict(COMPRESSOR_MODULES)
+    return [
+        name for name in requested
+        if name in modules and importlib.util.find_spec(modules[name]) is not None
+    ]
+
+
+def worker_count(argv: Optional[List[str]] = None) -> int:
+    """Worker processes sharing the pool budget
+
+    WEB_CONCURRENCY wins; otherwise the uvicorn/gunicorn ``--workers``/``-w``
+    flag (spawned and forked workers both keep the parent's ``sys.argv``).
+    """
+    if os.environ.get('WEB_CONCURRENCY'):
+        return max(_env_int('WEB_CONCURRENCY', 1), 1)
+    argv = sys.argv if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg in ("--workers", "-w") and i + 1 < len(argv):
+            value = argv[i + 1]
+        elif arg.startswith("--workers="):
+            value = arg.split("=", 1)[1]
+        else:
+            continue
+        if value.isdigit():
+            return max(int(value), 1)
+    return 1
+
+
+def pool_size_per_worker() -> int:
+    """Connections each worker may open"""
+    if os.environ.get('MONGO_MAX_POOL_SIZE'):
+        return _env_int('MONGO_MAX_POOL_SIZE', 100)
+    workers = worker_count()
+    return max(_env_int('MONGO_POOL_BUDGET', 100) // workers, _env_int('MONGO_MIN_POOL_PER_WORKER', 10))
+
+
+def client_options() -> Dict[str, Any]:
+    """Keyword arguments for ``AsyncIOMotorClient``"""
+    requested = os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib').split(',')
+    options = {
+        "appname": os.environ.get('MONGO_APP_NAME', 'setp-api'),
+        "maxPoolSize": pool_size_per_worker(),
+        "minPoolSize": _env_int('MONGO_MIN_POOL_SIZE', 0),
+        "maxConnecting": _env_int('MONGO_MAX_CONNECTING', 2),
+        "maxIdleTimeMS": _env_int('MONGO_MAX_IDLE_TIME_MS', 60000),
+        "waitQueueTimeoutMS": _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 1000),
+        "serverSelectionTimeoutMS": _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        "connectTimeoutMS": _env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        "socketTimeoutMS": _env_int('MONGO_SOCKET_TIMEOUT_MS', 30000),
+        "retryWrites": True,
+        "retryReads": True,
+    }
+    compressors = available_compressors([name.strip() for name in requested if name.strip()])
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+def catalog_read_preference():
+    """Read preference for catalog reads (MONGO_CATALOG_READ_PREFERENCE)"""
+    name = os.environ.get('MONGO_CATALOG_READ_PREFERENCE', 'primaryPreferred')
+    if name not in READ_PREFERENCES:
+        raise ValueError(
+            f"Unknown MONGO_CATALOG_READ_PREFERENCE '{name}', expected one of {', '.join(READ_PREFERENCES)}"
+        )
+    return READ_PREFERENCES[name]
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Track pool size, checkouts and waiters per server from pool events
+
+    Events arrive on driver threads, so counters are guarded by a lock.
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._open: Dict[Any, int] = defaultdict(int)
+        self._checked_out: Dict[Any, int] = defaultdict(int)
+        self._waiting: Dict[Any, int] = defaultdict(int)
+        self.checkout_timeouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def _add(self, counter: Dict[Any, int], address, delta: int):
+        with self._lock:
+            counter[address] = max(counter[address] + delta, 0)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            for counter in (self._open, self._checked_out, self._waiting):
+                counter.pop(event.address, None)
+
+    def connection_created(self, event):
+        self._add(self._open, event.address, 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(self._open, event.address, -1)
+
+    def connection_check_out_started(self, event):
+        self._add(self._waiting, event.address, 1)
+
+    def connection_check_out_failed(self, event):
+        self._add(self._waiting, event.address, -1)
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._waiting[event.address] = max(self._waiting[event.address] - 1, 0)
+            self._checked_out[event.address] += 1
+
+    def connection_checked_in(self, event):
+        self._add(self._checked_out, event.address, -1)
+
+    def saturation(self) -> float:
+        """Checked-out fraction of the pool for the busiest server (0.0 - 1.0)"""
+        with self._lock:
+            busiest = max(self._checked_out.values(), default=0)
+        return busiest / self.max_pool_size if self.max_pool_size else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_pool_size": self.max_pool_size,
+                "open": sum(self._open.values()),
+                "checked_out": sum(self._checked_out.values()),
+                "waiting": sum(self._waiting.values()),
+                "saturation": round(
+                    max(self._checked_out.values(), default=0) / self.max_pool_size, 4
+                ) if self.max_pool_size else 0.0,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+            }
@@ -0,0 +1,81 @@
+"""Keyset (seek) pagination with opaque cursors.
+
+A page is fetched by continuing from the sort key of the last row of the
+previous page instead of skipping rows, so with an index on the sort key
+every page costs O(page size) no matter how deep it is. The cursor is the
+last row's sort key values, JSON-encoded (with BSON types preserved) and
+base64url-encoded, tagged with the listing it belongs to so a cursor from
+one listing is rejected by another.
+
+Every sort must end in a unique field (``_id`` unless the filter already
+makes an earlier field unique) so rows with equal keys are never skipped or
+repeated across pages.
+"""
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bson import json_util
+
+
+SortKey = Sequence[Tuple[str, int]]
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that is malformed or belongs to another listing"""
+
+
+def encode_cursor(listing: str, values: List[Any]) -> str:
+    raw = json_util.dumps({"l": listing, "v": values}).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(listing: str, cursor: str, size: int) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json_util.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+    if not isinstance(data, dict) or data.get("l") != listing:
+        raise InvalidCursor("Cursor does not belong to this listing")
+    values = data.get("v")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Malformed cursor")
+    return values
+
+
+def _after(sort: SortKey, values: List[Any]) -> Dict[str, Any]:
+    """Filter matching rows strictly after ``values`` in ``sort`` order
+
+    For sort (a, b, c) that is: a > va, or a = va and b > vb, or a = va and
+    b = vb and c > vc (with < for descending fields).
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {prefix: value for (prefix, _), value in zip(sort[:i], values[:i])}
+        branch[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+async def keyset_page(collection, listing: str, query: Dict[str, Any], sort: SortKey,
+                      limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return up to ``limit`` rows after ``cursor`` and the cursor for the next page
+
+    The next cursor is None on the last page. ``_id`` is read for the cursor
+    but never returned.
+    """
+    sort = list(sort)
+    if cursor:
+        query = {"$and": [query, _after(sort, decode_cursor(listing, cursor, len(sort)))]}
+
+    # One extra row tells whether there is a next page without a count
+    rows = await collection.find(query).sort(sort).limit(limit + 1).to_list(limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(listing, [rows[-1].get(field) for field, _ in sort])
+    for row in rows:
+        row.pop("_id", None)
+    return rows, next_cursor
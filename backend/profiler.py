@@ -0,0 +1,276 @@
+"""Opt-in statistical profiler for slow or sampled requests.
+
+While profiling is enabled and requests are in flight, a background thread
+samples the event loop thread's stack every few milliseconds. When a request
+finishes and is either randomly sampled or slower than the threshold, the
+stacks captured during its lifetime are written to disk in collapsed-stack
+format (one ``frame;frame;frame count`` line per distinct stack), ready for
+``flamegraph.pl`` or speedscope, next to a JSON file with the route and
+timings.
+
+The event loop interleaves requests, so a profile shows everything the loop
+did while the request was in flight; ``concurrent`` in the metadata says how
+many other requests shared it. Samples taken while the loop was idle in the
+selector are time spent waiting on I/O.
+
+Settings changed at runtime are stored in ``db.meta`` and every worker
+polls them every ``sync_interval`` seconds, so one admin request retunes
+all worker processes. Stored settings override the environment defaults.
+Dump counters and in-flight requests are per process; ``status`` names the
+worker that answered.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import request_mongo_seconds
+
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 128
+SAMPLE_HISTORY_SECONDS = 60
+PROFILER_META_ID = "profiler"
+SETTINGS = ("enabled", "sample_rate", "threshold_ms", "interval_ms")
+
+
+def _collapse(frame) -> str:
+    """Render a frame chain root-first as ``func (file:line);...``"""
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class RequestProfiler:
+    """Samples the loop thread and dumps profiles for slow or sampled requests"""
+
+    def __init__(self, output_dir: Path, enabled: bool = False, sample_rate: float = 0.0,
+                 threshold_ms: float = 500.0, interval_ms: float = 5.0,
+                 db=None, sync_interval: float = 5.0):
+        self.output_dir = Path(output_dir)
+        self._db = db
+        self.sync_interval = sync_interval
+        self.settings_version = 0
+        self._task: Optional[asyncio.Task] = None
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.enabled = False
+        self.active = 0
+        self.dumps = 0
+        self.last_dump: Optional[str] = None
+
+        self._samples: Deque[Tuple[float, str]] = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._target: Optional[int] = None  # ident of the event loop thread
+        if enabled:
+            self.enable()
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                  threshold_ms: Optional[float] = None, interval_ms: Optional[float] = None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        if enabled is True:
+            self.enable()
+        elif enabled is False:
+            self.disable()
+
+    def enable(self):
+        self.enabled = True
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def disable(self):
+        self.enabled = False
+        self._wake.set()
+        with self._lock:
+            self._samples.clear()
+
+    async def update(self, **changes) -> Dict[str, Any]:
+        """Store new settings for every worker and apply them here right away"""
+        changes = {k: v for k, v in changes.items() if k in SETTINGS and v is not None}
+        if self._db is None:
+            self.configure(**changes)
+            return self.status()
+        update: Dict[str, Any] = {"$inc": {"version": 1}}
+        if changes:
+            update["$set"] = changes
+        doc = await self._db.meta.find_one_and_update(
+            {"_id": PROFILER_META_ID}, update, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        self._apply(doc)
+        return self.status()
+
+    async def sync(self):
+        """Pick up settings another worker stored since the last sync"""
+        doc = await self._db.meta.find_one({"_id": PROFILER_META_ID})
+        if doc is not None and doc.get("version", 0) != self.settings_version:
+            self._apply(doc)
+
+    def _apply(self, doc: Dict[str, Any]):
+        self.configure(**{k: doc.get(k) for k in SETTINGS})
+        self.settings_version = doc.get("version", 0)
+
+    def start(self):
+        if self._db is not None and self._task is None and self.sync_interval > 0:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.disable()
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Profiler settings sync failed")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "worker_pid": os.getpid(),
+            "settings_version": self.settings_version,
+            "sync_interval_s": self.sync_interval,
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "threshold_ms": self.threshold_ms,
+            "interval_ms": self.interval_ms,
+            "output_dir": str(self.output_dir),
+            "active_requests": self.active,
+            "dumps": self.dumps,
+            "last_dump": self.last_dump,
+        }
+
+    def _sample_loop(self):
+        while self.enabled:
+            if not self.active or self._target is None:
+                # Nothing to attribute samples to; sleep until a request starts
+                self._wake.clear()
+                self._wake.wait(1.0)
+                continue
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                sample = (time.perf_counter(), _collapse(frame))
+                with self._lock:
+                    self._samples.append(sample)
+                    horizon = sample[0] - SAMPLE_HISTORY_SECONDS
+                    while self._samples and self._samples[0][0] < horizon:
+                        self._samples.popleft()
+            time.sleep(self.interval_ms / 1000)
+
+    def _samples_between(self, start: float, end: float) -> List[str]:
+        with self._lock:
+            return [stack for ts, stack in self._samples if start <= ts <= end]
+
+    def _release(self):
+        self.active -= 1
+        if not self.active:
+            # Drop history no in-flight request can still ask for
+            with self._lock:
+                self._samples.clear()
+
+    def _dump(self, stacks: List[str], meta: Dict[str, Any]) -> str:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", meta["route"]).strip("_") or "root"
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        base = self.output_dir / f"{stamp}-{meta['method']}-{slug}-{round(meta['duration_ms'])}ms"
+        folded = Counter(stacks)
+        with open(f"{base}.folded", "w") as out:
+            for stack, count in folded.most_common():
+                out.write(f"{stack} {count}\n")
+        with open(f"{base}.json", "w") as out:
+            json.dump(meta, out, indent=2)
+        return f"{base}.folded"
+
+
+class ProfilerMiddleware:
+    """ASGI middleware feeding requests to a ``RequestProfiler``"""
+
+    def __init__(self, app: ASGIApp, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = self.profiler
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiler._target = threading.get_ident()
+        profiler.active += 1
+        profiler._wake.set()
+        concurrent = profiler.active - 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            ended = time.perf_counter()
+            duration_ms = (ended - started) * 1000
+            slow = duration_ms >= profiler.threshold_ms
+            stacks: List[str] = []
+            if slow or random.random() < profiler.sample_rate:
+                stacks = profiler._samples_between(started, ended)
+            profiler._release()
+
+        if stacks:
+            mongo_seconds = request_mongo_seconds()
+            route = scope.get("route")
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None) or "<unmatched>",
+                "status": status,
+                "trigger": "threshold" if slow else "sample",
+                "duration_ms": round(duration_ms, 3),
+                "mongo_ms": round(mongo_seconds * 1000, 3) if mongo_seconds is not None else None,
+                "samples": len(stacks),
+                "interval_ms": profiler.interval_ms,
+                "concurrent": concurrent,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            }
+            try:
+                path = await asyncio.to_thread(profiler._dump, stacks, meta)
+            except OSError as exc:
+                logger.warning(f"Could not write profile: {exc}")
+            else:
+                profiler.dumps += 1
+                profiler.last_dump = path
@@ -0,0 +1,93 @@
+"""Per-attempt assessments drawn from a module's question bank.
+
+A module's assessment questions form its bank. Each attempt draws
+``draw_size`` of them, in random order and with each question's options
+shuffled, from a ``random.Random`` seeded per attempt. The draw is a pure
+function of the bank and the seed, so an attempt is stored as just its seed
+and the fingerprint of the answer key it was drawn from, and grading
+rebuilds the draw from the in-memory catalog instead of storing or reloading
+questions.
+
+Submitting is the only way to be graded, and it marks the attempt
+submitted, so every graded result comes from exactly one fresh draw.
+
+``Random.sample`` over a ``range`` picks indices without materializing the
+bank once it is much larger than the draw, so a draw costs O(k) however big
+the bank grows.
+"""
+import random
+import secrets
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from scoring import AnswerKey
+
+
+class StaleAttempt(Exception):
+    """Raised when the assessment changed after the attempt was drawn"""
+
+
+class Draw(NamedTuple):
+    questions: List[int]  # bank indices, in presentation order
+    option_orders: List[List[int]]  # per drawn question, original option indices in presentation order
+
+
+def draw_size(assessment: Dict[str, Any], default: int) -> int:
+    """Questions per attempt: the assessment's ``draw``, else ``default``, capped at the bank"""
+    bank = len(assessment['questions'])
+    size = assessment.get('draw') or default or bank
+    return max(1, min(size, bank))
+
+
+def draw(assessment: Dict[str, Any], size: int, seed: int) -> Draw:
+    """The ``size`` questions and option orders the seed selects"""
+    rng = random.Random(seed)
+    questions = rng.sample(range(len(assessment['questions'])), size)
+    option_orders = []
+    for index in questions:
+        order = list(range(len(assessment['questions'][index].get('options') or [])))
+        rng.shuffle(order)
+        option_orders.append(order)
+    return Draw(questions, option_orders)
+
+
+def new_attempt(user_id: str, answer_key: AnswerKey, size: int) -> Dict[str, Any]:
+    """Compact attempt document: everything needed to rebuild the draw"""
+    return {
+        "_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "module_id": answer_key.module_id,
+        "key": answer_key.fingerprint,
+        "seed": secrets.randbits(63),
+        "size": size,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def check_current(attempt: Dict[str, Any], answer_key: AnswerKey):
+    if attempt['key'] != answer_key.fingerprint:
+        raise StaleAttempt("The assessment changed since this attempt was started")
+
+
+def attempt_draw(attempt: Dict[str, Any], assessment: Dict[str, Any], answer_key: AnswerKey) -> Draw:
+    """Rebuild a stored attempt's draw from the current catalog"""
+    check_current(attempt, answer_key)
+    return draw(assessment, attempt['size'], attempt['seed'])
+
+
+def present(public_assessment: Dict[str, Any], attempt: Dict[str, Any], drawn: Draw) -> Dict[str, Any]:
+    """The attempt as shown to the user: drawn questions with shuffled options, no answers"""
+    questions = []
+    for index, order in zip(drawn.questions, drawn.option_orders):
+        question = dict(public_assessment['questions'][index])
+        options: Optional[List[str]] = question.get('options')
+        if options:
+            question['options'] = [options[i] for i in order]
+        questions.append(question)
+    return {
+        "attempt_id": attempt['_id'],
+        "id": public_assessment['id'],
+        "module_id": public_assessment['module_id'],
+        "questions": questions,
+    }
@@ -0,0 +1,136 @@
+"""Assessment grading from precompiled answer keys.
+
+An ``AnswerKey`` is compiled once per assessment (per catalog version) and
+grades submissions without touching the database.
+"""
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+PASSING_PERCENTAGE = 70
+
+# Codes in an answer log entry besides option indices
+OTHER_ANSWER = 254  # an answer that is not one of the listed options
+NO_ANSWER = 255
+
+
+def normalize_answer(answer: Optional[str]) -> Optional[str]:
+    """Canonical form used to compare answers (case and whitespace insensitive)"""
+    if answer is None:
+        return None
+    return " ".join(answer.split()).casefold()
+
+
+class AnswerKey:
+    """Compact answer key for one assessment
+
+    ``items`` holds ``(question_id, normalized_answer)`` pairs in question
+    order and ``correct_options`` the index of the correct option for each
+    question (-1 when the answer is not one of the listed options).
+    ``fingerprint`` identifies the questions, options and answers, so logged
+    option indices are only ever read against the key they were written for.
+    """
+
+    __slots__ = ("assessment_id", "module_id", "items", "correct_options", "option_index", "fingerprint")
+
+    def __init__(self, assessment_id: str, module_id: str, items: Tuple[Tuple[str, str], ...],
+                 correct_options: Tuple[int, ...], option_index: Tuple[Dict[str, int], ...] = (),
+                 fingerprint: str = ""):
+        self.assessment_id = assessment_id
+        self.module_id = module_id
+        self.items = items
+        self.correct_options = correct_options
+        self.option_index = option_index
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def compile(cls, assessment: Dict[str, Any]) -> "AnswerKey":
+        items = []
+        correct_options = []
+        option_index = []
+        for q in assessment['questions']:
+            items.append((q['id'], normalize_answer(q['correct_answer'])))
+            options = q.get('options') or []
+            try:
+                correct_options.append(options.index(q['correct_answer']))
+            except ValueError:
+                correct_options.append(-1)
+            index: Dict[str, int] = {}
+            for i, option in enumerate(options):
+                index.setdefault(normalize_answer(option), i)
+            option_index.append(index)
+        fingerprint = hashlib.sha256(json.dumps(
+            [[q['id'], q.get('options') or [], q['correct_answer']] for q in assessment['questions']]
+        ).encode()).hexdigest()[:16]
+        return cls(assessment['id'], assessment['module_id'], tuple(items), tuple(correct_options),
+                   tuple(option_index), fingerprint)
+
+    @property
+    def total(self) -> int:
+        return len(self.items)
+
+    def mask(self, answers: Dict[str, str], questions: Optional[Sequence[int]] = None) -> int:
+        """Bitmask of correctly answered questions
+
+        Bit j is ``questions[j]`` when grading a drawn subset of the bank
+        (only those questions are looked at), else question j.
+        """
+        items = self.items
+        mask = 0
+        for j, i in enumerate(range(len(items)) if questions is None else questions):
+            question_id, expected = items[i]
+            if normalize_answer(answers.get(question_id)) == expected:
+                mask |= 1 << j
+        return mask
+
+    def packed_mask(self, answers: Dict[str, str], questions: Optional[Sequence[int]] = None) -> bytes:
+        """``mask`` as little-endian bytes, one bit per question, for storage
+
+        The layout of ``np.packbits(..., bitorder="little")``; BSON integers
+        stop at 64 bits, so the int form only fits banks of up to 63 questions.
+        """
+        count = len(self.items) if questions is None else len(questions)
+        return self.mask(answers, questions).to_bytes((count + 7) // 8, "little")
+
+    def choices(self, answers: Dict[str, str], questions: Optional[Sequence[int]] = None) -> bytes:
+        """Chosen option index per question, one byte each, for the answer log
+
+        Follows the same question order as ``mask``.
+        """
+        codes = bytearray()
+        for i in range(len(self.items)) if questions is None else questions:
+            answer = normalize_answer(answers.get(self.items[i][0]))
+            index = self.option_index[i]
+            if answer is None:
+                codes.append(NO_ANSWER)
+            else:
+                codes.append(index.get(answer, OTHER_ANSWER))
+        return bytes(codes)
+
+    def grade(self, answers: Dict[str, str]) -> int:
+        """Number of correctly answered questions"""
+        return sum(
+            1 for question_id, expected in self.items
+            if normalize_answer(answers.get(question_id)) == expected
+        )
+
+    def grade_many(self, submissions: Iterable[Dict[str, str]]) -> List[int]:
+        """Grade a batch of answer maps (imports, replays) in one pass"""
+        items = self.items
+        return [
+            sum(1 for question_id, expected in items
+                if normalize_answer(answers.get(question_id)) == expected)
+            for answers in submissions
+        ]
+
+
+def result_for(correct: int, total: int) -> Dict[str, Any]:
+    """Score, percentage and pass/fail for a graded submission"""
+    percentage = (correct / total) * 100 if total > 0 else 0
+    return {
+        "score": correct,
+        "total": total,
+        "percentage": round(percentage, 1),
+        "passed": percentage >= PASSING_PERCENTAGE,
+    }
@@ -1,26 +1,141 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
+from typing import List, Literal, Optional, Dict, Any, Union
 import uuid
+import asyncio
+import json
+import hmac
 from datetime import datetime, timezone
 
+from analytics import load_module_stats, record_attempt, record_feedback, summarize
+from bulk_import import bulk_insert, detect_format, iter_lines, iter_records
+from catalog import CatalogCache, CatalogSnapshot
+from catalog_sync import sync_catalog
+from certificates import CertificateStore, CertificateUnavailable, certificate_data, certificate_key
+from export import MEDIA_TYPES, ExportUnavailable, check_format, export_progress
+from indexes import ensure_indexes
+from item_analysis import analyze, load_responses, log_entry
+from leaderboard import ALL as ALL_USERS, Leaderboard
+from markdown_render import render_sections
+from metrics import CONTENT_TYPE, InstrumentedDatabase, MetricsMiddleware, MultiProcessStore, gauges_from, registry
+from mongo_config import PoolMonitor, catalog_read_preference, client_options
+from pagination import InvalidCursor, keyset_page
+from profiler import ProfilerMiddleware, RequestProfiler
+from question_bank import StaleAttempt, attempt_draw, check_current, draw_size, new_attempt, present
+from scoring import AnswerKey, result_for
+from sessions import InvalidSession, Session, SessionSigner, UserCache, load_session_secret
+from snapshot import MappedSnapshot, SnapshotError
+from task_queue import TaskQueue
+from write_behind import WriteBehindFull, WriteBehindQueue
+from responses import BEST, FAST, DuplexStreamingResponse, EncodedPayload, encoded_response, etag_matches
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+mongo_options = client_options()
+pool_monitor = PoolMonitor(mongo_options['maxPoolSize'])
+client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_monitor], **mongo_options)
+# Every operation is timed per collection and charged to the calling request
+db = InstrumentedDatabase(client[os.environ['DB_NAME']])
+
+# Pre-encoded catalog snapshot shared read-only by all workers (see `cli.py serve`)
+catalog_snapshot_file = None
+if os.environ.get('CATALOG_SNAPSHOT'):
+    try:
+        catalog_snapshot_file = MappedSnapshot(os.environ['CATALOG_SNAPSHOT'])
+    except SnapshotError as exc:
+        logging.getLogger(__name__).warning(f"Ignoring catalog snapshot: {exc}")
+
+# In-memory catalog, revalidated against the version counter in db.meta
+catalog_cache = CatalogCache(
+    db,
+    check_interval=float(os.environ.get('CATALOG_CHECK_INTERVAL', '5')),
+    read_preference=catalog_read_preference(),
+    snapshot_file=catalog_snapshot_file,
+)
+DEFAULT_SUMMARY_LIMIT = 100
+# Rendered module HTML inlined in ?format=html responses; later sections are fetched lazily
+MODULE_HTML_INLINE_BYTES = int(os.environ.get('MODULE_HTML_INLINE_BYTES', '8192'))
+CATALOG_CACHE_MAX_AGE = int(os.environ.get('CATALOG_CACHE_MAX_AGE', '60'))
+USER_IMPORT_BATCH_SIZE = int(os.environ.get('USER_IMPORT_BATCH_SIZE', '1000'))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', '100'))
+# Questions drawn per attempt when an assessment sets no ``draw``; 0 means the whole bank
+ASSESSMENT_DRAW_SIZE = int(os.environ.get('ASSESSMENT_DRAW_SIZE', '0'))
+MAX_PAGE_SIZE = 500
+
+# /readyz fails once this fraction of the Mongo pool is checked out
+READY_MAX_POOL_SATURATION = float(os.environ.get('READY_MAX_POOL_SATURATION', '0.9'))
+READY_PING_TIMEOUT = float(os.environ.get('READY_PING_TIMEOUT', '1'))
+
+# Operator-only endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Feedback is written behind the request in insert_many batches
+feedback_writer = WriteBehindQueue(
+    db.feedback,
+    max_batch=int(os.environ.get('FEEDBACK_BATCH_SIZE', '500')),
+    flush_interval=float(os.environ.get('FEEDBACK_FLUSH_INTERVAL', '0.5')),
+    max_pending=int(os.environ.get('FEEDBACK_QUEUE_SIZE', '10000')),
+    after_flush=lambda docs: record_feedback(db, docs),
+)
+
+# Signed session tokens let user-scoped endpoints check identity without a db.users read
+session_signer = SessionSigner(
+    ttl_seconds=int(os.environ.get('SESSION_TTL_SECONDS', str(30 * 24 * 3600))),
+    refresh_grace=int(os.environ.get('SESSION_REFRESH_GRACE', str(90 * 24 * 3600))),
+)
+user_cache = UserCache(
+    lambda user_id: db.users.find_one({"id": user_id}, {"_id": 0}),
+    max_size=int(os.environ.get('USER_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('USER_CACHE_TTL', '300')),
+)
+
+# Ranked standings served from memory, rebuilt from db.progress periodically
+leaderboard = Leaderboard(db, refresh_interval=float(os.environ.get('LEADERBOARD_REFRESH_INTERVAL', '5')))
+LEADERBOARD_MAX_LIMIT = 100
+
+# Side effects of a graded submission run after the response, from a durable outbox
+task_queue = TaskQueue(
+    db.outbox,
+    workers=int(os.environ.get('TASK_WORKERS', '4')),
+    max_pending=int(os.environ.get('TASK_QUEUE_SIZE', '10000')),
+    max_attempts=int(os.environ.get('TASK_MAX_ATTEMPTS', '5')),
+    poll_interval=float(os.environ.get('TASK_POLL_INTERVAL', '5')),
+)
+
+# Certificates render in a process pool and are kept on disk by content hash
+certificate_store = CertificateStore(
+    Path(os.environ.get('CERTIFICATE_DIR', ROOT_DIR / 'certificate_cache')),
+    workers=int(os.environ.get('CERTIFICATE_WORKERS', '1')),
+)
+
+# Opt-in stack sampling of slow requests, switchable at runtime via /api/admin/profiler
+profiler = RequestProfiler(
+    Path(os.environ.get('PROFILE_DIR', ROOT_DIR / 'profiles')),
+    enabled=os.environ.get('PROFILE_ENABLED', '').lower() in ('1', 'true', 'yes'),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    threshold_ms=float(os.environ.get('PROFILE_THRESHOLD_MS', '500')),
+    interval_ms=float(os.environ.get('PROFILE_INTERVAL_MS', '5')),
+    # Runtime changes are shared through db.meta and polled by every worker
+    db=db,
+    sync_interval=float(os.environ.get('PROFILE_SYNC_INTERVAL', '5')),
+)
 
 # Create the main app without a prefix
 app = FastAPI()
+app.state.ready = False
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -34,6 +149,9 @@ class User(BaseModel):
     role: str  # 'staff' or 'student'
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class UserSession(User):
+    token: str  # send as "Authorization: Bearer <token>" on user-scoped endpoints
+
 class UserCreate(BaseModel):
     name: str
     role: str
@@ -48,6 +166,36 @@ class Module(BaseModel):
     content: str
     duration: str
 
+ModuleList = TypeAdapter(List[Module])
+
+class ModuleSection(BaseModel):
+    index: int
+    title: str
+    html: Optional[str] = None  # None when not inlined; fetch /modules/{id}/sections/{index}
+
+class ModuleHtml(BaseModel):
+    id: str
+    title: str
+    description: str
+    order: int
+    video_url: str
+    duration: str
+    sections: List[ModuleSection]
+
+class ModuleSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    title: str
+    description: str
+    order: int
+    duration: str
+
+class ModuleSummaryPage(BaseModel):
+    items: List[ModuleSummary]
+    # Pass as ?after=&after_id= to fetch the next page; id breaks ties between equal orders
+    next_after: Optional[int] = None
+    next_after_id: Optional[str] = None
+
 class Question(BaseModel):
     id: str
     question: str
@@ -61,8 +209,15 @@ class Assessment(BaseModel):
     module_id: str
     questions: List[Question]
 
+class AssessmentInfo(BaseModel):
+    id: str
+    module_id: str
+    bank_size: int
+    draw_size: int  # questions per attempt
+
 class AssessmentSubmission(BaseModel):
-    user_id: str
+    user_id: Optional[str] = None  # defaults to the session user; must match it if given
+    attempt_id: str  # from POST /assessments/{module_id}/attempts; each attempt is graded once
     answers: Dict[str, str]  # question_id -> answer
 
 class AssessmentResult(BaseModel):
@@ -81,6 +236,32 @@ class Progress(BaseModel):
     total_questions: Optional[int] = None
     completed_at: Optional[datetime] = None
 
+class ProgressPage(BaseModel):
+    items: List[Progress]
+    next_cursor: Optional[str] = None  # pass as ?cursor= to fetch the next page
+
+class DashboardModule(ModuleSummary):
+    progress: Optional[Progress] = None
+
+class Dashboard(BaseModel):
+    modules: List[DashboardModule]
+    completed_modules: int
+    total_modules: int
+    completion_percentage: float
+
+class ModuleAnalytics(BaseModel):
+    module_id: str
+    title: str
+    order: int
+    attempts: int
+    passes: int
+    pass_rate: float
+    average_score_percentage: float
+    score_histogram: List[int]  # attempts per score decile (0-9%, ..., 90-100%)
+    feedback_count: int
+    average_rating: Optional[float] = None
+    rating_histogram: Dict[str, int]
+
 class Feedback(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -90,12 +271,45 @@ class Feedback(BaseModel):
     comments: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class FeedbackPage(BaseModel):
+    items: List[Feedback]
+    next_cursor: Optional[str] = None
+
 class FeedbackCreate(BaseModel):
-    user_id: str
+    user_id: Optional[str] = None  # defaults to the session user; must match it if given
     module_id: str
     rating: int
     comments: str
 
+class LeaderboardEntry(BaseModel):
+    rank: int  # 1-based within the requested cohort
+    user_id: str
+    name: Optional[str] = None
+    role: Optional[str] = None
+    total_score: int  # sum of best scores across modules
+    completed_modules: int
+
+class LeaderboardPage(BaseModel):
+    cohort: str
+    total: int
+    entries: List[LeaderboardEntry]
+
+class LeaderboardRank(LeaderboardEntry):
+    cohort: str
+    out_of: int
+
+class CohortStats(BaseModel):
+    cohort: str
+    users: int
+    average_total_score: float
+    average_completed_modules: float
+
+class ProfilerSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)  # fraction of requests profiled regardless of latency
+    threshold_ms: Optional[float] = Field(None, ge=0)
+    interval_ms: Optional[float] = Field(None, ge=1)
+
 
 # Initialize modules data
 MODULES_DATA = [
@@ -1043,139 +1257,703 @@ ASSESSMENTS_DATA = [
 
 
 async def initialize_data():
-    """Initialize modules and assessments data if not exists"""
-    # Check if modules exist
-    existing_modules = await db.modules.count_documents({})
-    if existing_modules == 0:
-        await db.modules.insert_many(MODULES_DATA)
-        logger.info("Initialized modules data")
-    
-    # Check if assessments exist
-    existing_assessments = await db.assessments.count_documents({})
-    if existing_assessments == 0:
-        await db.assessments.insert_many(ASSESSMENTS_DATA)
-        logger.info("Initialized assessments data")
+    """Sync modules and assessments with the catalog defined in code"""
+    result = await sync_catalog(
+        db, MODULES_DATA, ASSESSMENTS_DATA,
+        lock_ttl=float(os.environ.get('CATALOG_SYNC_LOCK_TTL', '30')),
+    )
+    logger.info(f"Catalog sync: {result['status']} ({result['content_hash'][:12]})")
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with a matching X-Admin-Token header"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def _verify_bearer(authorization: Optional[str], refreshing: bool = False) -> Session:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Session token required",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return session_signer.verify(token.strip(), refreshing=refreshing)
+    except InvalidSession as exc:
+        raise HTTPException(status_code=401, detail=str(exc), headers={"WWW-Authenticate": "Bearer"})
+
+
+async def require_session(authorization: Optional[str] = Header(None)) -> Session:
+    """Resolve the caller from an "Authorization: Bearer" session token"""
+    return _verify_bearer(authorization)
+
+
+async def require_signed_in(
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Allow any signed-in user, or an operator with the admin token"""
+    if ADMIN_TOKEN and x_admin_token and hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        return
+    await require_session(authorization)
+
+
+async def require_user_access(
+    user_id: str,
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Allow the user themselves, or an operator with the admin token"""
+    if ADMIN_TOKEN and x_admin_token and hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        if await user_cache.get(user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return
+    session = await require_session(authorization)
+    if session.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed to access another user's data")
+
+
+def acting_user(session: Session, claimed: Optional[str]) -> str:
+    """The session user, rejecting a body user_id that names someone else"""
+    if claimed is not None and claimed != session.user_id:
+        raise HTTPException(status_code=403, detail="user_id does not match the session")
+    return session.user_id
 
 
 # Routes
-@api_router.post("/users", response_model=User)
+@api_router.post("/users", response_model=UserSession)
 async def create_user(input: UserCreate):
-    """Create a new user with role selection"""
+    """Create a new user with role selection and start their session"""
     user = User(name=input.name, role=input.role)
     doc = user.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.users.insert_one(doc)
+    doc.pop('_id', None)
+    user_cache.put(doc)
+    leaderboard.register_user(user.id, user.name, user.role)
+    return UserSession(**user.model_dump(), token=session_signer.issue(doc))
+
+
+@api_router.get("/users/me", response_model=User)
+async def get_current_user(session: Session = Depends(require_session)):
+    """Get the user behind the session token"""
+    user = await user_cache.get(session.user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
-@api_router.get("/modules", response_model=List[Module])
-async def get_modules():
-    """Get all training modules"""
-    modules = await db.modules.find({}, {"_id": 0}).to_list(100)
-    return modules
+@api_router.post("/sessions/refresh", response_model=UserSession)
+async def refresh_session(authorization: Optional[str] = Header(None)):
+    """Exchange a current or recently expired session token for a fresh one"""
+    session = _verify_bearer(authorization, refreshing=True)
+    user = await user_cache.get(session.user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserSession(**user, token=session_signer.issue(user))
+
+
+@api_router.post("/users/{user_id}/session", response_model=UserSession, dependencies=[Depends(require_admin)])
+async def issue_user_session(user_id: str):
+    """Start a session for an existing user (imported, or past the refresh grace period)"""
+    user = await user_cache.get(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserSession(**user, token=session_signer.issue(user))
+
+
+def _new_user_doc(record: Dict[str, Any]) -> Dict[str, Any]:
+    user = User(**UserCreate(**record).model_dump())
+    doc = user.model_dump()
+    doc['created_at'] = doc['created_at'].isoformat()
+    return doc
+
+
+@api_router.post("/users/bulk", dependencies=[Depends(require_admin)])
+async def create_users_bulk(request: Request):
+    """Create users from a streamed CSV (name,role header) or NDJSON body
+
+    Streams back one NDJSON result per input row as batches are written;
+    each created user comes with their session token.
+    """
+    fmt = detect_format(request.headers.get("content-type", ""))
+    records = iter_records(iter_lines(request.stream()), fmt)
+
+    def created(doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {"token": session_signer.issue(doc)}
+
+    async def results():
+        async for result in bulk_insert(db.users, records, _new_user_doc, USER_IMPORT_BATCH_SIZE, created):
+            yield json.dumps(result) + "\n"
+
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def _modules_payload(catalog: CatalogSnapshot, compression=FAST) -> EncodedPayload:
+    return EncodedPayload(ModuleList.dump_json(ModuleList.validate_python(catalog.modules)),
+                          compression=compression)
+
+
+def _summary_page(catalog: CatalogSnapshot, after: Optional[int], limit: int,
+                  after_id: Optional[str] = None) -> bytes:
+    items, next_key = catalog.summary_page(after, limit, after_id)
+    next_after, next_after_id = next_key or (None, None)
+    page = ModuleSummaryPage.model_validate(
+        {"items": items, "next_after": next_after, "next_after_id": next_after_id}
+    )
+    return page.model_dump_json().encode()
+
+
+def _summary_payload(catalog: CatalogSnapshot, limit: int, compression=FAST) -> EncodedPayload:
+    return EncodedPayload(_summary_page(catalog, None, limit), compression=compression)
+
+
+def _module_payload(module: Dict[str, Any], compression=FAST) -> EncodedPayload:
+    return EncodedPayload(Module.model_validate(module).model_dump_json().encode(), compression=compression)
+
+
+def _rendered_sections(catalog: CatalogSnapshot, module_id: str):
+    """Module content rendered to HTML sections, once per catalog version"""
+    module = catalog.modules_by_id[module_id]
+    return catalog.derived(("rendered", module_id), lambda: render_sections(module['content']))
+
+
+def _module_html_payload(catalog: CatalogSnapshot, module_id: str, compression=FAST) -> EncodedPayload:
+    module = catalog.modules_by_id[module_id]
+    sections = []
+    inlined = 0
+    for index, section in enumerate(_rendered_sections(catalog, module_id)):
+        # Always inline the first section so the page has something to show
+        inline = index == 0 or inlined + len(section.html) <= MODULE_HTML_INLINE_BYTES
+        if inline:
+            inlined += len(section.html)
+        sections.append({"index": index, "title": section.title, "html": section.html if inline else None})
+    body = ModuleHtml.model_validate({**module, "sections": sections})
+    return EncodedPayload(body.model_dump_json().encode(), compression=compression)
+
+
+def _section_payload(catalog: CatalogSnapshot, module_id: str, index: int, compression=FAST) -> EncodedPayload:
+    section = _rendered_sections(catalog, module_id)[index]
+    body = ModuleSection(index=index, title=section.title, html=section.html)
+    return EncodedPayload(body.model_dump_json().encode(), compression=compression)
+
+
+def _section_count(catalog: CatalogSnapshot, module_id: str) -> int:
+    # Known from the snapshot index when one is mapped, so nothing is rendered
+    if catalog.mapped is not None:
+        count = catalog.mapped.section_count(module_id)
+        if count is not None:
+            return count
+    return len(_rendered_sections(catalog, module_id))
 
 
-@api_router.get("/modules/{module_id}", response_model=Module)
-async def get_module(module_id: str):
+def catalog_section_counts(catalog: CatalogSnapshot) -> Dict[str, int]:
+    """Rendered sections per module, recorded in snapshots"""
+    return {module['id']: len(_rendered_sections(catalog, module['id'])) for module in catalog.modules}
+
+
+def catalog_payloads(catalog: CatalogSnapshot, compression=BEST) -> Dict[str, EncodedPayload]:
+    """Every cacheable catalog response body, keyed as the routes look them up
+
+    Used for snapshot builds, so bodies get the slow, best compression by default.
+    """
+    payloads = {
+        "modules": _modules_payload(catalog, compression),
+        f"summary:{DEFAULT_SUMMARY_LIMIT}": _summary_payload(catalog, DEFAULT_SUMMARY_LIMIT, compression),
+    }
+    for module in catalog.modules:
+        module_id = module['id']
+        payloads[f"module:{module_id}"] = _module_payload(module, compression)
+        payloads[f"module-html:{module_id}"] = _module_html_payload(catalog, module_id, compression)
+        for index in range(len(_rendered_sections(catalog, module_id))):
+            payloads[f"section:{module_id}:{index}"] = _section_payload(catalog, module_id, index, compression)
+    return payloads
+
+
+@api_router.get("/modules", response_model=List[Module])
+async def get_modules(request: Request):
+    """Get all training modules"""
+    catalog = await catalog_cache.get()
+    # Validated, encoded and compressed once per catalog version
+    payload = catalog.payload("modules", lambda: _modules_payload(catalog))
+    return encoded_response(request, payload, max_age=CATALOG_CACHE_MAX_AGE)
+
+
+@api_router.get("/modules/summary", response_model=ModuleSummaryPage)
+async def get_module_summaries(
+    request: Request,
+    after: Optional[int] = Query(None, description="next_after from the previous page"),
+    after_id: Optional[str] = Query(None, description="next_after_id from the previous page"),
+    limit: int = Query(DEFAULT_SUMMARY_LIMIT, ge=1, le=500),
+):
+    """Get module summaries (no lesson content) sorted by order, one page at a time"""
+    catalog = await catalog_cache.get()
+    # Only the first page is worth encoding and keeping around; it is what
+    # every dashboard asks for. Later pages are rare and sent uncompressed.
+    if after is None:
+        payload = catalog.payload(f"summary:{limit}", lambda: _summary_payload(catalog, limit))
+        return encoded_response(request, payload, max_age=CATALOG_CACHE_MAX_AGE)
+    return Response(_summary_page(catalog, after, limit, after_id), media_type="application/json")
+
+
+@api_router.get("/modules/{module_id}", response_model=Union[Module, ModuleHtml])
+async def get_module(
+    module_id: str,
+    request: Request,
+    content_format: Literal["markdown", "html"] = Query(
+        "markdown", alias="format",
+        description="html returns the content pre-rendered to sanitized HTML sections",
+    ),
+):
     """Get a specific module by ID"""
-    module = await db.modules.find_one({"id": module_id}, {"_id": 0})
+    catalog = await catalog_cache.get()
+    module = catalog.modules_by_id.get(module_id)
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
-    return module
+    if content_format == "html":
+        payload = catalog.payload(f"module-html:{module_id}", lambda: _module_html_payload(catalog, module_id))
+    else:
+        payload = catalog.payload(f"module:{module_id}", lambda: _module_payload(module))
+    return encoded_response(request, payload, max_age=CATALOG_CACHE_MAX_AGE)
+
+
+@api_router.get("/modules/{module_id}/sections/{index}", response_model=ModuleSection)
+async def get_module_section(module_id: str, index: int, request: Request):
+    """Get one rendered HTML section of a module's content"""
+    catalog = await catalog_cache.get()
+    if module_id not in catalog.modules_by_id:
+        raise HTTPException(status_code=404, detail="Module not found")
+    if not 0 <= index < _section_count(catalog, module_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    payload = catalog.payload(
+        f"section:{module_id}:{index}", lambda: _section_payload(catalog, module_id, index)
+    )
+    return encoded_response(request, payload, max_age=CATALOG_CACHE_MAX_AGE)
 
 
-@api_router.get("/assessments/{module_id}")
+@api_router.get("/assessments/{module_id}", response_model=AssessmentInfo)
 async def get_assessment(module_id: str):
-    """Get assessment for a module (without correct answers)"""
-    assessment = await db.assessments.find_one({"module_id": module_id}, {"_id": 0})
+    """Get the size of a module's question bank and of each attempt"""
+    catalog = await catalog_cache.get()
+    # Questions are only handed out through attempts, each a fresh random draw
+    assessment = catalog.assessments.get(module_id)
     if not assessment:
         raise HTTPException(status_code=404, detail="Assessment not found")
-    
-    # Remove correct answers before sending to client
-    questions = []
-    for q in assessment['questions']:
-        question_copy = q.copy()
-        question_copy.pop('correct_answer', None)
-        questions.append(question_copy)
-    
     return {
         "id": assessment['id'],
-        "module_id": assessment['module_id'],
-        "questions": questions
+        "module_id": module_id,
+        "bank_size": len(assessment['questions']),
+        "draw_size": draw_size(assessment, ASSESSMENT_DRAW_SIZE),
     }
 
 
+@api_router.post("/assessments/{module_id}/attempts")
+async def start_attempt(module_id: str, session: Session = Depends(require_session)):
+    """Draw a new attempt: a random subset of the question bank with shuffled options"""
+    catalog = await catalog_cache.get()
+    answer_key = catalog.answer_keys.get(module_id)
+    if not answer_key:
+        raise HTTPException(status_code=404, detail="Assessment not found")
+    assessment = catalog.assessments[module_id]
+    # Only the seed is stored; the draw is rebuilt from the catalog when grading
+    attempt = new_attempt(session.user_id, answer_key, draw_size(assessment, ASSESSMENT_DRAW_SIZE))
+    await db.attempts.insert_one(attempt)
+    drawn = attempt_draw(attempt, assessment, answer_key)
+    return present(catalog.public_assessments[module_id], attempt, drawn)
+
+
+async def save_progress(progress_doc: Dict[str, Any]):
+    """Store a graded attempt if it beats the user's best score for the module"""
+    # Best score wins in a single round trip: the filter only matches a row
+    # with a worse (or missing) score. When a row with an equal or better
+    # score exists the upsert turns into an insert, which the unique
+    # (user_id, module_id) index rejects, so there is nothing left to do.
+    try:
+        await db.progress.update_one(
+            {
+                "user_id": progress_doc['user_id'],
+                "module_id": progress_doc['module_id'],
+                "score": {"$not": {"$gte": progress_doc['score']}}
+            },
+            # updated_at lets every worker's leaderboard pick up the change (Leaderboard.sync)
+            {"$set": {**progress_doc, "updated_at": datetime.now(timezone.utc)},
+             "$setOnInsert": {"id": str(uuid.uuid4())}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+
+async def _save_submitted_progress(job: Dict[str, Any]):
+    await save_progress({
+        "user_id": job['user_id'],
+        "module_id": job['module_id'],
+        "completed": job['passed'],
+        "score": job['score'],
+        "total_questions": job['total_questions'],
+        "completed_at": job['completed_at'],
+    })
+
+
+async def _record_submitted_attempt(job: Dict[str, Any]):
+    await record_attempt(db, job['module_id'], job['score'], job['total_questions'], job['passed'])
+
+
+async def _rank_submission(job: Dict[str, Any]):
+    # The token carried name and role, so the leaderboard needs no lookup
+    leaderboard.register_user(job['user_id'], job['name'], job['role'])
+    await leaderboard.record(job['user_id'], job['module_id'], job['score'], job['passed'], job['completed_at'])
+
+
+async def _log_submitted_answers(job: Dict[str, Any]):
+    try:
+        await db.attempt_log.insert_one(log_entry(
+            job['attempt_id'], job['user_id'], job['module_id'], job['answer_key'],
+            job['mask'], job['choices'], job['completed_at'], job.get('questions'),
+        ))
+    except DuplicateKeyError:
+        # Logged by an earlier run of this job
+        pass
+
+
+async def _claim_submitted_attempt(job: Dict[str, Any]) -> bool:
+    """Mark the attempt submitted by this submission; False if another one got it first"""
+    # Runs inside the job, so an attempt is only used up once its grading is
+    # queued. Matching our own submission id keeps retries of the job passing.
+    claimed = await db.attempts.update_one(
+        {"_id": job['attempt_id'],
+         "$or": [{"submitted_at": None}, {"submission_id": job['submission_id']}]},
+        {"$set": {"submitted_at": datetime.now(timezone.utc), "submission_id": job['submission_id']}},
+    )
+    return claimed.matched_count == 1
+
+
+task_queue.register(
+    "assessment_submitted",
+    ("progress", _save_submitted_progress),
+    ("rollup", _record_submitted_attempt),
+    ("leaderboard", _rank_submission),
+    ("answers", _log_submitted_answers),
+    guard=_claim_submitted_attempt,
+)
+
+
+async def _usable_attempt(attempt_id: str, user_id: str, answer_key: AnswerKey) -> Dict[str, Any]:
+    """Load the attempt being submitted, rejecting one that cannot be graded"""
+    attempt = await db.attempts.find_one({"_id": attempt_id})
+    if not attempt or attempt['module_id'] != answer_key.module_id:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    if attempt['user_id'] != user_id:
+        raise HTTPException(status_code=403, detail="Attempt belongs to another user")
+    try:
+        check_current(attempt, answer_key)
+    except StaleAttempt as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if attempt.get('submitted_at') is not None:
+        raise HTTPException(status_code=409, detail="This attempt was already submitted")
+    return attempt
+
+
 @api_router.post("/assessments/{module_id}/submit", response_model=AssessmentResult)
-async def submit_assessment(module_id: str, submission: AssessmentSubmission):
+async def submit_assessment(module_id: str, submission: AssessmentSubmission,
+                            session: Session = Depends(require_session)):
     """Submit assessment answers and get results"""
-    assessment = await db.assessments.find_one({"module_id": module_id})
-    if not assessment:
+    user_id = acting_user(session, submission.user_id)
+    catalog = await catalog_cache.get()
+    # Graded from the compiled answer key; the only read is the attempt itself
+    answer_key = catalog.answer_keys.get(module_id)
+    if not answer_key:
         raise HTTPException(status_code=404, detail="Assessment not found")
     
-    # Calculate score
-    correct = 0
-    total = len(assessment['questions'])
-    
-    for question in assessment['questions']:
-        user_answer = submission.answers.get(question['id'])
-        if user_answer == question['correct_answer']:
-            correct += 1
-    
-    percentage = (correct / total) * 100 if total > 0 else 0
-    passed = percentage >= 70  # 70% passing grade
-    
-    # Save or update progress
-    existing_progress = await db.progress.find_one({
-        "user_id": submission.user_id,
-        "module_id": module_id
-    })
-    
-    progress_doc = {
-        "user_id": submission.user_id,
-        "module_id": module_id,
-        "completed": passed,
-        "score": correct,
-        "total_questions": total,
-        "completed_at": datetime.now(timezone.utc).isoformat()
-    }
+    attempt = await _usable_attempt(submission.attempt_id, user_id, answer_key)
+    questions = attempt_draw(attempt, catalog.assessments[module_id], answer_key).questions
+
+    mask = answer_key.packed_mask(submission.answers, questions)
+    result = AssessmentResult(**result_for(int.from_bytes(mask, "little").bit_count(), len(questions)))
+    correct, total, passed = result.score, result.total, result.passed
     
-    if existing_progress:
-        # Update only if new score is better
-        if correct > existing_progress.get('score', 0):
-            await db.progress.update_one(
-                {"user_id": submission.user_id, "module_id": module_id},
-                {"$set": progress_doc}
-            )
-    else:
-        progress_doc['id'] = str(uuid.uuid4())
-        await db.progress.insert_one(progress_doc)
+    # Progress, rollups and the leaderboard are updated by the task queue;
+    # the request only waits for the outbox insert. The job id is the
+    # attempt's, so a second submission racing this one is refused while
+    # the job is queued, and the job's guard refuses it after that.
+    try:
+        await task_queue.enqueue("assessment_submitted", {
+            "attempt_id": attempt['_id'],
+            "submission_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "name": session.name,
+            "role": session.role,
+            "module_id": module_id,
+            "score": correct,
+            "total_questions": total,
+            "passed": passed,
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+            "answer_key": answer_key.fingerprint,
+            "mask": mask,
+            "choices": answer_key.choices(submission.answers, questions),
+            "questions": questions,
+        }, job_id=f"submission:{attempt['_id']}")
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="This attempt was already submitted")
     
-    return AssessmentResult(
-        score=correct,
-        total=total,
-        percentage=round(percentage, 1),
-        passed=passed
-    )
+    return result
 
 
 @api_router.post("/feedback", response_model=Feedback)
-async def submit_feedback(input: FeedbackCreate):
+async def submit_feedback(input: FeedbackCreate, session: Session = Depends(require_session)):
     """Submit feedback for a module"""
-    feedback = Feedback(**input.model_dump())
+    feedback = Feedback(**{**input.model_dump(), "user_id": acting_user(session, input.user_id)})
     doc = feedback.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    await db.feedback.insert_one(doc)
+    try:
+        await feedback_writer.put(doc)
+    except WriteBehindFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Feedback queue is full, please retry",
+            headers={"Retry-After": "1"},
+        )
     return feedback
 
 
-@api_router.get("/progress/{user_id}")
-async def get_user_progress(user_id: str):
-    """Get progress for a user across all modules"""
-    progress_list = await db.progress.find(
-        {"user_id": user_id},
-        {"_id": 0}
-    ).to_list(100)
-    return progress_list
+@api_router.get("/feedback/queue", dependencies=[Depends(require_admin)])
+async def get_feedback_queue_stats():
+    """Get depth and flush latency of the feedback write-behind queue"""
+    return feedback_writer.stats()
+
+
+async def _page(collection, listing: str, query: Dict[str, Any], sort, limit: int,
+                cursor: Optional[str]) -> Dict[str, Any]:
+    try:
+        items, next_cursor = await keyset_page(collection, listing, query, sort, limit, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@api_router.get("/progress", response_model=ProgressPage, dependencies=[Depends(require_admin)])
+async def list_progress(
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """List progress across the organisation, most recent completion first"""
+    return await _page(
+        db.progress, "progress", {}, [("completed_at", -1), ("_id", -1)], limit, cursor
+    )
+
+
+@api_router.get("/progress/{user_id}", response_model=ProgressPage,
+                dependencies=[Depends(require_user_access)])
+async def get_user_progress(
+    user_id: str,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Get progress for a user across all modules, by module id"""
+    # (user_id, module_id) is unique, so module_id alone is a total order here
+    return await _page(
+        db.progress, f"progress:user:{user_id}", {"user_id": user_id},
+        [("module_id", 1)], limit, cursor,
+    )
+
+
+@api_router.get("/modules/{module_id}/progress", response_model=ProgressPage,
+                dependencies=[Depends(require_admin)])
+async def list_module_progress(
+    module_id: str,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """List every user's progress on a module, most recent completion first"""
+    return await _page(
+        db.progress, f"progress:module:{module_id}", {"module_id": module_id},
+        [("completed_at", -1), ("_id", -1)], limit, cursor,
+    )
+
+
+@api_router.get("/modules/{module_id}/feedback", response_model=FeedbackPage,
+                dependencies=[Depends(require_admin)])
+async def list_module_feedback(
+    module_id: str,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """List feedback for a module, newest first"""
+    return await _page(
+        db.feedback, f"feedback:module:{module_id}", {"module_id": module_id},
+        [("created_at", -1), ("_id", -1)], limit, cursor,
+    )
+
+
+@api_router.get("/dashboard/{user_id}", response_model=Dashboard,
+                dependencies=[Depends(require_user_access)])
+async def get_dashboard(user_id: str):
+    """Get module summaries joined with the user's progress in one call"""
+    catalog, progress_list = await asyncio.gather(
+        catalog_cache.get(),
+        db.progress.find({"user_id": user_id}, {"_id": 0}).to_list(None),
+    )
+
+    # Index progress by module so the join is O(modules + progress)
+    progress_by_module = {p['module_id']: p for p in progress_list}
+    modules = []
+    completed = 0
+    for summary in catalog.summaries:
+        module_progress = progress_by_module.get(summary['id'])
+        if module_progress and module_progress.get('completed'):
+            completed += 1
+        modules.append({**summary, "progress": module_progress})
+
+    total = len(modules)
+    return Dashboard(
+        modules=modules,
+        completed_modules=completed,
+        total_modules=total,
+        completion_percentage=round((completed / total) * 100, 1) if total > 0 else 0,
+    )
+
+
+@api_router.get("/certificates/{user_id}", dependencies=[Depends(require_user_access)],
+                response_class=FileResponse)
+async def get_certificate(user_id: str, request: Request):
+    """Download the user's completion certificate as a PDF once every module is passed"""
+    user, catalog, progress_list = await asyncio.gather(
+        user_cache.get(user_id),
+        catalog_cache.get(),
+        db.progress.find({"user_id": user_id, "completed": True}, {"_id": 0}).to_list(None),
+    )
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        data = certificate_data(user, catalog.summaries, progress_list)
+    except CertificateUnavailable as exc:
+        raise HTTPException(status_code=409, detail=f"Certificate not available: {exc}")
+
+    headers = {"ETag": f'"{certificate_key(data)}"', "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), [headers["ETag"]]):
+        return Response(status_code=304, headers=headers)
+    path = await certificate_store.get(data)
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename=f"certificate-{user['name']}.pdf",
+        headers=headers,
+    )
+
+
+@api_router.get("/analytics/modules", response_model=List[ModuleAnalytics],
+                dependencies=[Depends(require_admin)])
+async def get_module_analytics():
+    """Get pass rates, score distribution and feedback ratings per module"""
+    catalog, stats = await asyncio.gather(catalog_cache.get(), load_module_stats(db))
+    return [
+        {
+            "module_id": summary['id'],
+            "title": summary['title'],
+            "order": summary['order'],
+            **summarize(stats.get(summary['id'], {})),
+        }
+        for summary in catalog.summaries
+    ]
+
+
+@api_router.get("/leaderboard", response_model=LeaderboardPage, dependencies=[Depends(require_signed_in)])
+async def get_leaderboard(
+    cohort: str = Query(ALL_USERS, description="'all' or a role such as 'staff' or 'student'"),
+    limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """Get the top users by total best score, earliest first on ties"""
+    return {
+        "cohort": cohort,
+        "total": leaderboard.size(cohort),
+        "entries": leaderboard.top(limit, offset, cohort),
+    }
+
+
+@api_router.get("/leaderboard/cohorts", response_model=List[CohortStats],
+                dependencies=[Depends(require_signed_in)])
+async def get_leaderboard_cohorts():
+    """Get user counts and average scores per cohort"""
+    return leaderboard.cohorts()
+
+
+@api_router.get("/leaderboard/users/{user_id}", response_model=LeaderboardRank,
+                dependencies=[Depends(require_user_access)])
+async def get_leaderboard_rank(user_id: str, cohort: str = ALL_USERS):
+    """Get a user's rank within a cohort"""
+    entry = leaderboard.rank_of(user_id, cohort)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="User has no ranked attempts in this cohort")
+    return {**entry, "cohort": cohort}
+
+
+@api_router.get("/export/progress", dependencies=[Depends(require_admin)])
+async def export_progress_report(
+    format: str = Query("csv", description="csv or parquet"),
+    completed_only: bool = False,
+):
+    """Stream every user's progress joined with user details as CSV or Parquet"""
+    try:
+        check_format(format)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except ExportUnavailable as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+
+    filename = f"progress-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        export_progress(db, format, batch_size=EXPORT_BATCH_SIZE, completed_only=completed_only),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@api_router.get("/catalog/stats", dependencies=[Depends(require_admin)])
+async def get_catalog_stats():
+    """Get hit/miss counters for the in-memory catalog cache"""
+    return catalog_cache.stats()
+
+
+@api_router.get("/admin/tasks", dependencies=[Depends(require_admin)])
+async def get_task_queue_status():
+    """Get background task counters and outbox jobs by status"""
+    return {**task_queue.stats(), "outbox": await task_queue.outbox_counts()}
+
+
+@api_router.get("/admin/item-analysis", dependencies=[Depends(require_admin)])
+async def get_item_analysis(module_id: Optional[str] = None):
+    """Get difficulty, discrimination and option selection rates per question"""
+    catalog = await catalog_cache.get()
+    if module_id is not None and module_id not in catalog.answer_keys:
+        raise HTTPException(status_code=404, detail="Assessment not found")
+    module_ids = [module_id] if module_id else list(catalog.answer_keys)
+
+    async def report(module_id: str) -> Dict[str, Any]:
+        answer_key = catalog.answer_keys[module_id]
+        responses = await load_responses(db, answer_key)
+        # Vectorized, but still CPU work proportional to the log size
+        return await asyncio.to_thread(analyze, catalog.assessments[module_id], answer_key, responses)
+
+    return await asyncio.gather(*(report(m) for m in module_ids))
+
+
+@api_router.get("/admin/profiler", dependencies=[Depends(require_admin)])
+async def get_profiler_status():
+    """Get the request profiler settings and this worker's dump counters"""
+    return profiler.status()
+
+
+@api_router.post("/admin/profiler", dependencies=[Depends(require_admin)])
+async def update_profiler(settings: ProfilerSettings):
+    """Enable, disable or retune the request profiler on every worker without a restart
+
+    Applied here at once and by the other workers within ``sync_interval_s``.
+    """
+    status = await profiler.update(**settings.model_dump())
+    logger.info(f"Request profiler updated: {status}")
+    return status
 
 
 # Include the router in the main app
@@ -1188,6 +1966,55 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+app.add_middleware(MetricsMiddleware, skip_paths=("/metrics", "/healthz", "/readyz"))
+
+registry.add_collector(lambda: gauges_from("catalog_cache", "In-memory catalog cache", catalog_cache.stats()))
+registry.add_collector(lambda: gauges_from("feedback_queue", "Feedback write-behind queue", feedback_writer.stats()))
+registry.add_collector(lambda: gauges_from("user_cache", "User record cache", user_cache.stats()))
+registry.add_collector(lambda: gauges_from("task_queue", "Background task queue", task_queue.stats()))
+registry.add_collector(lambda: gauges_from("certificates", "Certificate renderer", certificate_store.stats()))
+registry.add_collector(lambda: gauges_from("leaderboard", "In-memory leaderboard", leaderboard.stats()))
+registry.add_collector(lambda: gauges_from("mongo_pool", "MongoDB connection pool", pool_monitor.stats()))
+
+# Under several workers a scrape merges every worker's values (see cli.py serve)
+metrics_store = (
+    MultiProcessStore(registry, Path(os.environ['PROMETHEUS_MULTIPROC_DIR']))
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR') else None
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Expose request, MongoDB and cache metrics in Prometheus text format"""
+    body = await metrics_store.render() if metrics_store else registry.render()
+    return PlainTextResponse(body, media_type=CONTENT_TYPE)
+
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and serving; reports pool usage without touching Mongo"""
+    return {"status": "ok", "mongo_pool": pool_monitor.stats()}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: started, Mongo reachable and the connection pool not exhausted"""
+    pool = pool_monitor.stats()
+    checks = {"started": app.state.ready, "pool": pool['saturation'] < READY_MAX_POOL_SATURATION}
+    # Pinging through an exhausted pool would only queue behind the requests
+    if checks['started'] and checks['pool']:
+        try:
+            await asyncio.wait_for(client.admin.command('ping'), READY_PING_TIMEOUT)
+            checks['mongo'] = True
+        except Exception as exc:
+            logger.warning(f"Readiness ping failed: {exc!r}")
+            checks['mongo'] = False
+    ready = all(checks.values()) and 'mongo' in checks
+    return JSONResponse(
+        {"status": "ready" if ready else "unavailable", "checks": checks, "mongo_pool": pool},
+        status_code=200 if ready else 503,
+    )
 
 # Configure logging
 logging.basicConfig(
@@ -1199,10 +2026,31 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    session_signer.secret = await load_session_secret(db)
+    await ensure_indexes(db)
     await initialize_data()
+    feedback_writer.start()
+    await leaderboard.rebuild()
+    leaderboard.start()
+    await profiler.sync()
+    profiler.start()
+    if metrics_store:
+        metrics_store.start()
+    # Also picks up jobs left in the outbox by a previous run
+    task_queue.start()
+    app.state.ready = True
     logger.info("Application started and data initialized")
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.ready = False
+    # Flush buffered writes before the connection goes away
+    await task_queue.stop()
+    await feedback_writer.stop()
+    await leaderboard.stop()
+    await profiler.stop()
+    if metrics_store:
+        await metrics_store.stop()
+    certificate_store.shutdown()
     client.close()
\ No newline at end of file
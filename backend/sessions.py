@@ -0,0 +1,170 @@
+"""Signed session tokens and a bounded cache of user records.
+
+``create_user`` (and the bulk import) hands out an HS256 JWT whose claims
+carry the user's id, name and role. Verifying it is a signature check
+against the session secret with no database call, so user-scoped endpoints
+can check who is calling without an extra ``db.users`` round trip. Users
+are never deleted, so a valid token is also proof that the user exists.
+
+A token can be exchanged for a fresh one until ``refresh_grace`` seconds
+after it expires; past that, or for users who never got one, an operator
+issues a new token with the admin token.
+
+Lookups that still need the user record (an operator reading someone else's
+progress) go through ``UserCache``, an LRU with a per-entry TTL.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+import jwt
+from pymongo import ReturnDocument
+
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = "HS256"
+SECRET_META_ID = "session_secret"
+
+
+class InvalidSession(Exception):
+    """Raised for a token that is malformed, forged or expired"""
+
+
+class Session(NamedTuple):
+    user_id: str
+    name: str
+    role: str
+    expires_at: int
+
+
+async def load_session_secret(db) -> str:
+    """SESSION_SECRET, or a generated one kept in ``db.meta``
+
+    Without a configured secret the first process to start generates one and
+    stores it, so every worker and every restart signs with the same key.
+    """
+    secret = os.environ.get('SESSION_SECRET')
+    if secret:
+        return secret
+    # $setOnInsert: whoever upserts first wins, everyone else reads their secret
+    doc = await db.meta.find_one_and_update(
+        {"_id": SECRET_META_ID},
+        {"$setOnInsert": {"secret": secrets.token_urlsafe(32)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    logger.warning("SESSION_SECRET is not set; using the generated secret stored in db.meta")
+    return doc['secret']
+
+
+class SessionSigner:
+    """Issue and verify session tokens"""
+
+    def __init__(self, ttl_seconds: int, refresh_grace: int, secret: Optional[str] = None):
+        # Set at startup when it comes from the database (see load_session_secret)
+        self.secret = secret
+        self.ttl_seconds = ttl_seconds
+        self.refresh_grace = refresh_grace
+
+    @property
+    def _secret(self) -> str:
+        if not self.secret:
+            raise RuntimeError("Session secret not loaded yet")
+        return self.secret
+
+    def issue(self, user: Dict[str, Any]) -> str:
+        now = int(time.time())
+        claims = {
+            "sub": user['id'],
+            "name": user['name'],
+            "role": user['role'],
+            "iat": now,
+            "exp": now + self.ttl_seconds,
+        }
+        return jwt.encode(claims, self._secret, algorithm=ALGORITHM)
+
+    def verify(self, token: str, refreshing: bool = False) -> Session:
+        """Check a token; ``refreshing`` also accepts it up to ``refresh_grace`` past expiry"""
+        try:
+            claims = jwt.decode(
+                token, self._secret, algorithms=[ALGORITHM], options={"require": ["sub", "exp"]},
+                leeway=self.refresh_grace if refreshing else 0,
+            )
+        except jwt.ExpiredSignatureError as exc:
+            raise InvalidSession("Session expired") from exc
+        except jwt.InvalidTokenError as exc:
+            raise InvalidSession("Invalid session token") from exc
+        return Session(claims['sub'], claims.get('name', ""), claims.get('role', ""), claims['exp'])
+
+
+class UserCache:
+    """LRU of user records with TTL eviction, loading misses through ``load``
+
+    Concurrent misses for the same user share one load. Missing users are
+    not cached, so a user created on another worker is found on the next
+    lookup.
+    """
+
+    def __init__(self, load: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+                 max_size: int = 10000, ttl: float = 300.0):
+        self._load = load
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (expires, user)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, user: Dict[str, Any]):
+        self._entries[user['id']] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user['id'])
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            del self._entries[user_id]
+        self.misses += 1
+
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self._loading[user_id] = asyncio.get_running_loop().create_future()
+        try:
+            user = await self._load(user_id)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as exc:
+            pending.set_exception(exc)
+            # Retrieved here so a load nobody else waited on is not logged as unhandled
+            pending.exception()
+            raise
+        else:
+            pending.set_result(user)
+        finally:
+            del self._loading[user_id]
+        if user is not None:
+            self.put(user)
+        return user
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,180 @@
+"""Read-only catalog snapshot file shared by every worker through mmap.
+
+The snapshot holds the raw catalog plus every pre-encoded catalog response
+body (identity, gzip and brotli), so the expensive serialization and
+compression happen once at deploy time instead of once per worker. Workers
+map the file read-only: the operating system keeps a single copy in the page
+cache no matter how many workers map it, and a worker's cold start is a
+``json.loads`` of the catalog instead of two Mongo queries and a round of
+compression. Being built offline, the bodies also get the best (slowest)
+compression settings, brotli at quality 11, which workers cannot afford.
+
+Layout::
+
+    MAGIC | index length (8 bytes, big endian) | index (JSON) | blobs
+
+The index records the catalog content hash (see ``catalog_sync``), a SHA-256
+of the blob region, the number of rendered sections per module (so workers
+can bounds-check section requests without rendering) and, for every
+payload, the offset and length of each body relative to the start of the
+blobs.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from responses import EncodedPayload
+
+
+MAGIC = b"SETPSNAP1\n"
+_LENGTH = struct.Struct(">Q")
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, truncated or corrupt"""
+
+
+def write_snapshot(path: Path, content_hash: str, catalog: Dict[str, Any],
+                   payloads: Dict[str, EncodedPayload], sections: Dict[str, int]) -> int:
+    """Write a snapshot atomically; returns its size in bytes
+
+    The file is written next to ``path`` and renamed into place, so workers
+    that already mapped the previous snapshot keep a consistent view of it.
+    """
+    blobs: List[bytes] = []
+    offset = 0
+
+    def add(blob: bytes) -> Tuple[int, int]:
+        nonlocal offset
+        blobs.append(blob)
+        span = (offset, len(blob))
+        offset += len(blob)
+        return span
+
+    index: Dict[str, Any] = {
+        "content_hash": content_hash,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "catalog": add(json.dumps(catalog, separators=(",", ":"), default=str).encode()),
+        "sections": sections,
+        "payloads": {},
+    }
+    for key, payload in payloads.items():
+        index["payloads"][key] = {
+            "media_type": payload.media_type,
+            "etags": payload.etags,
+            "bodies": {coding: add(body) for coding, body in payload.bodies.items()},
+        }
+    digest = hashlib.sha256()
+    for blob in blobs:
+        digest.update(blob)
+    index["blob_digest"] = digest.hexdigest()
+
+    encoded_index = json.dumps(index, separators=(",", ":")).encode()
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as out:
+        out.write(MAGIC)
+        out.write(_LENGTH.pack(len(encoded_index)))
+        out.write(encoded_index)
+        for blob in blobs:
+            out.write(blob)
+    os.replace(tmp, path)
+    return len(MAGIC) + _LENGTH.size + len(encoded_index) + offset
+
+
+class _MappedBodies(Mapping):
+    """Body per content coding, sliced out of the mapping on access"""
+
+    def __init__(self, buffer: mmap.mmap, base: int, spans: Dict[str, List[int]]):
+        self._buffer = buffer
+        self._base = base
+        self._spans = spans
+
+    def __getitem__(self, coding: str) -> bytes:
+        offset, length = self._spans[coding]
+        start = self._base + offset
+        return self._buffer[start:start + length]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._spans)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+
+class MappedPayload:
+    """Drop-in for ``EncodedPayload`` whose bodies live in the snapshot file"""
+
+    def __init__(self, media_type: str, etags: Dict[str, str], bodies: _MappedBodies):
+        self.media_type = media_type
+        self.etags = etags
+        self.bodies = bodies
+
+    @property
+    def encodings(self) -> List[str]:
+        return list(self.bodies)
+
+
+class MappedSnapshot:
+    """A snapshot file mapped read-only into this process"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try:
+            with open(self.path, "rb") as source:
+                self._buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            raise SnapshotError(f"Cannot map catalog snapshot {self.path}: {exc}") from exc
+
+        header = len(MAGIC) + _LENGTH.size
+        if self._buffer[:len(MAGIC)] != MAGIC or len(self._buffer) < header:
+            raise SnapshotError(f"{self.path} is not a catalog snapshot")
+        (index_length,) = _LENGTH.unpack(self._buffer[len(MAGIC):header])
+        self._base = header + index_length
+        try:
+            self._index = json.loads(self._buffer[header:self._base])
+        except ValueError as exc:
+            raise SnapshotError(f"Corrupt snapshot index in {self.path}") from exc
+        if hashlib.sha256(self._buffer[self._base:]).hexdigest() != self._index["blob_digest"]:
+            raise SnapshotError(f"Snapshot {self.path} is truncated or corrupt")
+
+        self.content_hash: str = self._index["content_hash"]
+        self.created_at: str = self._index["created_at"]
+        self._payloads: Dict[str, MappedPayload] = {
+            key: MappedPayload(
+                entry["media_type"], entry["etags"],
+                _MappedBodies(self._buffer, self._base, entry["bodies"]),
+            )
+            for key, entry in self._index["payloads"].items()
+        }
+
+    def catalog(self) -> Dict[str, Any]:
+        """The raw catalog (``{"modules": [...], "assessments": [...]}``)"""
+        offset, length = self._index["catalog"]
+        start = self._base + offset
+        return json.loads(self._buffer[start:start + length])
+
+    def payload(self, key: str) -> Optional[MappedPayload]:
+        return self._payloads.get(key)
+
+    def section_count(self, module_id: str) -> Optional[int]:
+        """Rendered sections of the module, or None if the snapshot predates the count"""
+        return self._index.get("sections", {}).get(module_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "content_hash": self.content_hash,
+            "created_at": self.created_at,
+            "bytes": len(self._buffer),
+            "payloads": len(self._payloads),
+        }
+
+    def close(self):
+        self._buffer.close()
@@ -0,0 +1,315 @@
+"""In-process background jobs backed by a durable Mongo outbox.
+
+``enqueue`` inserts the job into ``db.outbox`` and hands it to a bounded pool
+of worker tasks, so a request only pays for that one insert and its side
+effects run after the response. A job is a list of named steps that run
+concurrently; a failed job is retried with exponential backoff, skipping the
+steps that already succeeded, until ``max_attempts`` is reached and it is
+parked with status ``failed`` for inspection. A job kind may also have a
+guard that runs before the steps on every attempt. It claims whatever the
+job works on, such as a submitted assessment attempt. When it returns False
+the job is a duplicate and is dropped without running any steps.
+
+Every job carries a lease (``owner``, ``lease_until``). The process that
+enqueued it holds the lease while the job is queued, running or waiting to
+retry, renewing it on every poll and again right before running it; jobs
+whose lease has lapsed (the process died, or its queue was full) are
+claimed by whichever worker polls next, so nothing is lost on restart. A
+job is only run after its owner has confirmed the lease, so one that
+another process took over in the meantime is dropped instead of run twice.
+Delivery is still at-least-once: a process that dies mid-job leaves every
+step of it to run again, so steps should be idempotent or tolerate a rare
+repeat.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument
+
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+FAILED = "failed"
+
+Step = Tuple[str, Callable[[Dict[str, Any]], Awaitable[Any]]]
+Guard = Callable[[Dict[str, Any]], Awaitable[bool]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class TaskQueue:
+    """Bounded worker pool in front of the outbox collection"""
+
+    def __init__(self, collection, workers: int = 4, max_pending: int = 10000,
+                 max_attempts: int = 5, backoff_base: float = 0.5, backoff_max: float = 60.0,
+                 lease: float = 60.0, poll_interval: float = 5.0, drain_timeout: float = 5.0):
+        self._collection = collection
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._steps: Dict[str, List[Step]] = {}
+        self._guards: Dict[str, Guard] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[asyncio.TimerHandle] = set()
+        # Ids of the jobs sitting in (or taken from) the in-memory queue
+        self._held: Set[str] = set()
+
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.recovered = 0
+        self.overflowed = 0
+        self.lost = 0
+        self.dropped = 0
+        self.last_job_ms = 0.0
+        self.max_job_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def register(self, kind: str, *steps: Step, guard: Optional[Guard] = None):
+        """Declare the named steps a job of ``kind`` runs
+
+        ``guard`` must be idempotent for the same job, since a retried job
+        runs it again.
+        """
+        self._steps[kind] = list(steps)
+        if guard is not None:
+            self._guards[kind] = guard
+
+    def start(self):
+        if not self.running:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._poll()))
+
+    async def stop(self):
+        """Finish queued jobs for up to ``drain_timeout`` seconds, then release the rest"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping task queue with {self._queue.qsize()} jobs still queued")
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Unfinished jobs become claimable right away instead of when their lease runs out
+        await self._collection.update_many(
+            {"owner": self.owner, "status": PENDING}, {"$set": {"lease_until": _now()}}
+        )
+
+    async def join(self):
+        """Wait until every job queued so far has been run"""
+        await self._queue.join()
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        """Persist a job and schedule it; returns the job id
+
+        A caller-chosen ``job_id`` raises ``DuplicateKeyError`` while a job
+        with that id is still in the outbox.
+        """
+        if kind not in self._steps:
+            raise KeyError(f"No steps registered for job kind {kind!r}")
+        now = _now()
+        job = {
+            "_id": job_id or str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "done": [],
+            "created_at": now,
+            "run_after": now,
+            "owner": self.owner,
+            "lease_until": now + timedelta(seconds=self.lease),
+        }
+        await self._collection.insert_one(job)
+        self.enqueued += 1
+        if not self.running:
+            # Not started (e.g. CLI usage): run the job in place
+            await self._run(job)
+        else:
+            await self._schedule(job)
+        return job['_id']
+
+    async def _schedule(self, job: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(job)
+            self._held.add(job['_id'])
+        except asyncio.QueueFull:
+            # Leave it to whichever worker polls next
+            self.overflowed += 1
+            await self._collection.update_one(
+                {"_id": job['_id'], "owner": self.owner}, {"$set": {"lease_until": _now()}}
+            )
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception(f"Task queue bookkeeping failed for job {job['_id']}")
+            finally:
+                self._held.discard(job['_id'])
+                self._queue.task_done()
+
+    async def _renew(self, job_id: str) -> bool:
+        """Extend this process's lease on the job; False if another process holds it now"""
+        renewed = await self._collection.update_one(
+            {"_id": job_id, "owner": self.owner, "status": PENDING},
+            {"$set": {"lease_until": _now() + timedelta(seconds=self.lease)}},
+        )
+        return renewed.matched_count == 1
+
+    async def _run(self, job: Dict[str, Any]):
+        if not await self._renew(job['_id']):
+            # Our lease lapsed while the job waited and another worker claimed it
+            self.lost += 1
+            logger.warning(f"Job {job['_id']} ({job['kind']}) was taken over by another worker, skipping")
+            return
+        started = time.perf_counter()
+        done = set(job.get('done', []))
+        steps = [(name, fn) for name, fn in self._steps[job['kind']] if name not in done]
+        errors = []
+        guard = self._guards.get(job['kind'])
+        if guard is not None:
+            try:
+                if not await guard(job['payload']):
+                    logger.info(f"Job {job['_id']} ({job['kind']}) duplicates work already claimed, dropping")
+                    await self._collection.delete_one({"_id": job['_id']})
+                    self.dropped += 1
+                    return
+            except Exception as exc:
+                errors.append(f"guard: {exc!r}")
+                steps = []
+        results = await asyncio.gather(*(fn(job['payload']) for _, fn in steps), return_exceptions=True)
+        for (name, _), result in zip(steps, results):
+            if isinstance(result, BaseException):
+                errors.append(f"{name}: {result!r}")
+            else:
+                done.add(name)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.last_job_ms = elapsed_ms
+        self.max_job_ms = max(self.max_job_ms, elapsed_ms)
+        if not errors:
+            await self._collection.delete_one({"_id": job['_id']})
+            self.completed += 1
+            return
+
+        job['attempts'] += 1
+        job['done'] = sorted(done)
+        if job['attempts'] >= self.max_attempts:
+            logger.error(f"Job {job['_id']} ({job['kind']}) failed after {job['attempts']} attempts: {errors}")
+            self.failed += 1
+            await self._collection.update_one({"_id": job['_id']}, {"$set": {
+                "status": FAILED, "attempts": job['attempts'], "done": job['done'], "errors": errors,
+            }})
+            return
+
+        # Full jitter keeps retries of a shared failure from arriving together
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (job['attempts'] - 1)))
+        logger.warning(f"Job {job['_id']} ({job['kind']}) attempt {job['attempts']} failed, retrying in {delay:.2f}s: {errors}")
+        self.retried += 1
+        run_after = _now() + timedelta(seconds=delay)
+        await self._collection.update_one({"_id": job['_id']}, {"$set": {
+            "attempts": job['attempts'], "done": job['done'], "errors": errors, "run_after": run_after,
+            "owner": self.owner, "lease_until": run_after + timedelta(seconds=self.lease),
+        }})
+        if self.running:
+            self._retry_later(job, delay)
+
+    def _retry_later(self, job: Dict[str, Any], delay: float):
+        loop = asyncio.get_running_loop()
+
+        def fire():
+            self._retries.discard(handle)
+            loop.create_task(self._schedule(job))
+
+        handle = loop.call_later(delay, fire)
+        self._retries.add(handle)
+
+    async def _poll(self):
+        while True:
+            try:
+                await self._renew_held()
+                await self._claim_lapsed()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Task queue poll failed")
+            # Often enough that held leases are renewed well before they lapse
+            await asyncio.sleep(min(self.poll_interval, self.lease / 3))
+
+    async def _renew_held(self):
+        """Keep the leases of queued and running jobs from lapsing"""
+        if self._held:
+            await self._collection.update_many(
+                {"_id": {"$in": list(self._held)}, "owner": self.owner},
+                {"$set": {"lease_until": _now() + timedelta(seconds=self.lease)}},
+            )
+
+    async def _claim_lapsed(self):
+        """Take over due jobs whose lease has lapsed, as far as the queue has room"""
+        while not self._queue.full():
+            now = _now()
+            job = await self._collection.find_one_and_update(
+                {"status": PENDING, "lease_until": {"$lte": now}, "run_after": {"$lte": now},
+                 # Never our own queued jobs, even if a slow poll let their lease run out
+                 "_id": {"$nin": list(self._held)}},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=self.lease)}},
+                sort=[("lease_until", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                return
+            self.recovered += 1
+            self._queue.put_nowait(job)
+            self._held.add(job['_id'])
+
+    async def outbox_counts(self) -> Dict[str, int]:
+        rows = await self._collection.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]).to_list(None)
+        return {row['_id']: row['count'] for row in rows}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "workers": self.workers,
+            "waiting_retry": len(self._retries),
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "recovered": self.recovered,
+            "overflowed": self.overflowed,
+            "lost": self.lost,
+            "dropped": self.dropped,
+            "last_job_ms": round(self.last_job_ms, 3),
+            "max_job_ms": round(self.max_job_ms, 3),
+        }
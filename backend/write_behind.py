@@ -0,0 +1,179 @@
+"""Write-behind buffering for documents nobody reads synchronously.
+
+Documents are queued in memory and written with ``insert_many`` once a batch
+fills up or the flush interval expires, whichever comes first. The queue is
+bounded: when it is full, ``put`` waits up to ``put_timeout`` seconds and then
+raises ``WriteBehindFull`` so callers can shed load instead of piling up
+memory.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindFull(Exception):
+    """Raised when the queue stays full for longer than the put timeout"""
+
+
+class WriteBehindQueue:
+    """Bounded in-memory buffer in front of a single collection
+
+    ``after_flush`` is awaited with the documents of each batch that were
+    newly written, e.g. to maintain rollups alongside the raw documents.
+    """
+
+    def __init__(self, collection, max_batch: int = 500, flush_interval: float = 0.5,
+                 max_pending: int = 10000, put_timeout: float = 1.0, max_retries: int = 3,
+                 after_flush: Optional[Callable[[List[Dict[str, Any]]], Awaitable[Any]]] = None):
+        self._collection = collection
+        self._after_flush = after_flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: List[Dict[str, Any]] = []
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and write out everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # A batch interrupted mid-write is written again; documents already
+        # carry their _id, so anything that did land is skipped as a duplicate
+        pending = self._inflight
+        self._inflight = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.max_batch):
+            await self._flush(pending[start:start + self.max_batch])
+
+    async def put(self, doc: Dict[str, Any]):
+        """Queue a document for writing"""
+        if not self.running:
+            # Not started (e.g. CLI usage): write straight through
+            await self._collection.insert_one(doc)
+            self.enqueued += 1
+            self.written += 1
+            await self._run_after_flush([doc])
+            return
+
+        try:
+            self._queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(doc), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise WriteBehindFull("write-behind queue is full")
+        self.enqueued += 1
+        if self._queue.qsize() >= self.max_batch:
+            self._batch_ready.set()
+
+    async def _run(self):
+        while True:
+            # Anything dequeued is tracked in _inflight so stop() can still write it
+            self._inflight = batch = [await self._queue.get()]
+            # Give the batch a chance to fill up unless it already has
+            if self._queue.qsize() + 1 < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._flush(batch)
+            self._inflight = []
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        started = time.perf_counter()
+        written = []
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self._collection.insert_many(batch, ordered=False)
+                written = batch
+                break
+            except BulkWriteError as exc:
+                errors = exc.details.get('writeErrors', [])
+                failed = {error['index'] for error in errors}
+                written = [doc for i, doc in enumerate(batch) if i not in failed]
+                # Duplicates are documents written by an earlier, interrupted attempt
+                real_errors = [error for error in errors if error.get('code') != 11000]
+                if real_errors:
+                    logger.error(f"Write-behind flush failed: {real_errors[:3]}")
+                    self.dropped += len(real_errors)
+                self.written += len(errors) - len(real_errors)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if attempt == self.max_retries:
+                    logger.exception(f"Dropping {len(batch)} documents after {attempt} attempts")
+                    self.dropped += len(batch)
+                    break
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.flush_seconds_total += elapsed_ms / 1000
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+        self.written += len(written)
+        await self._run_after_flush(written)
+
+    async def _run_after_flush(self, written: List[Dict[str, Any]]):
+        if written and self._after_flush is not None:
+            try:
+                await self._after_flush(written)
+            except Exception:
+                logger.exception("Write-behind after_flush hook failed")
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and flush latency counters"""
+        return {
+            "depth": self._queue.qsize() + len(self._inflight),
+            "capacity": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.flush_seconds_total * 1000 / self.flushes, 3) if self.flushes else 0.0,
+        }
@@ -12,6 +12,36 @@ const API = `${BACKEND_URL}/api`;
 
 export { API };
 
+// Identify the signed-in user on every API call with their session token
+axios.interceptors.request.use((config) => {
+  const storedUser = localStorage.getItem("user");
+  const token = storedUser && JSON.parse(storedUser).token;
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
+// An expired session is exchanged for a fresh token once, then the request is retried
+axios.interceptors.response.use(undefined, async (error) => {
+  const { config, response } = error;
+  const storedUser = localStorage.getItem("user");
+  if (response?.status !== 401 || !storedUser || config._retried || config.url.endsWith("/sessions/refresh")) {
+    throw error;
+  }
+  try {
+    const refreshed = await axios.post(`${API}/sessions/refresh`);
+    localStorage.setItem("user", JSON.stringify(refreshed.data));
+  } catch (refreshError) {
+    // Too old to refresh: the user has to be signed in again by an operator or sign up
+    localStorage.removeItem("user");
+    throw error;
+  }
+  config._retried = true;
+  delete config.headers.Authorization;
+  return axios(config);
+});
+
 function App() {
   return (
     <div className="App">
@@ -7,19 +7,21 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/com
 import { Progress } from "@/components/ui/progress";
 import { Badge } from "@/components/ui/badge";
 import { toast } from "sonner";
-import { Shield, Clock, CheckCircle, Lock, PlayCircle } from "lucide-react";
+import { Shield, Clock, CheckCircle, Lock, PlayCircle, Award } from "lucide-react";
 
 const Dashboard = () => {
   const [user, setUser] = useState(null);
   const [modules, setModules] = useState([]);
-  const [progress, setProgress] = useState([]);
+  const [overall, setOverall] = useState({ completed: 0, percentage: 0 });
   const [loading, setLoading] = useState(true);
   const navigate = useNavigate();
 
   useEffect(() => {
     // Get user from localStorage
     const storedUser = localStorage.getItem("user");
-    if (!storedUser) {
+    // Users saved before sessions existed have no token and must start again
+    if (!storedUser || !JSON.parse(storedUser).token) {
+      localStorage.removeItem("user");
       navigate("/");
       return;
     }
@@ -31,13 +33,14 @@ const Dashboard = () => {
 
   const loadData = async (userId) => {
     try {
-      const [modulesRes, progressRes] = await Promise.all([
-        axios.get(`${API}/modules`),
-        axios.get(`${API}/progress/${userId}`)
-      ]);
+      // Modules arrive already joined with this user's progress
+      const response = await axios.get(`${API}/dashboard/${userId}`);
       
-      setModules(modulesRes.data);
-      setProgress(progressRes.data);
+      setModules(response.data.modules);
+      setOverall({
+        completed: response.data.completed_modules,
+        percentage: response.data.completion_percentage
+      });
     } catch (error) {
       console.error("Error loading data:", error);
       toast.error("Failed to load modules");
@@ -46,14 +49,20 @@ const Dashboard = () => {
     }
   };
 
-  const getModuleProgress = (moduleId) => {
-    return progress.find(p => p.module_id === moduleId);
-  };
-
-  const calculateOverallProgress = () => {
-    if (modules.length === 0) return 0;
-    const completed = progress.filter(p => p.completed).length;
-    return (completed / modules.length) * 100;
+  const handleDownloadCertificate = async () => {
+    try {
+      // Fetched through axios so the session token is sent along
+      const response = await axios.get(`${API}/certificates/${user.id}`, { responseType: "blob" });
+      const url = URL.createObjectURL(response.data);
+      const link = document.createElement("a");
+      link.href = url;
+      link.download = "certificate.pdf";
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error("Error downloading certificate:", error);
+      toast.error("Failed to download certificate");
+    }
   };
 
   const handleLogout = () => {
@@ -104,12 +113,18 @@ const Dashboard = () => {
             <div className="space-y-2">
               <div className="flex justify-between text-sm">
                 <span className="text-gray-600">Overall Completion</span>
-                <span className="font-semibold" data-testid="progress-percentage">{Math.round(calculateOverallProgress())}%</span>
+                <span className="font-semibold" data-testid="progress-percentage">{Math.round(overall.percentage)}%</span>
               </div>
-              <Progress value={calculateOverallProgress()} className="h-3" />
+              <Progress value={overall.percentage} className="h-3" />
               <p className="text-sm text-gray-500">
-                {progress.filter(p => p.completed).length} of {modules.length} modules completed
+                {overall.completed} of {modules.length} modules completed
               </p>
+              {modules.length > 0 && overall.completed === modules.length && (
+                <Button onClick={handleDownloadCertificate} className="mt-2" data-testid="download-certificate-button">
+                  <Award className="w-4 h-4 mr-2" />
+                  Download Certificate
+                </Button>
+              )}
             </div>
           </CardContent>
         </Card>
@@ -119,7 +134,7 @@ const Dashboard = () => {
           <h2 className="text-2xl font-semibold text-gray-900">Training Modules</h2>
           <div className="grid gap-6">
             {modules.map((module) => {
-              const moduleProgress = getModuleProgress(module.id);
+              const moduleProgress = module.progress;
               const isCompleted = moduleProgress?.completed;
               
               return (
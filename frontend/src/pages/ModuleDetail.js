@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import axios from "axios";
 import { API } from "@/App";
@@ -12,7 +12,34 @@ import { Badge } from "@/components/ui/badge";
 import { Separator } from "@/components/ui/separator";
 import { toast } from "sonner";
 import { ArrowLeft, BookOpen, Award, MessageSquare, CheckCircle, XCircle, Star } from "lucide-react";
-import ReactMarkdown from 'react-markdown';
+
+// A content section rendered to sanitized HTML by the backend; sections that
+// were not inlined are fetched once they scroll into view
+const ModuleSection = ({ moduleId, section }) => {
+  const [html, setHtml] = useState(section.html);
+  const ref = useRef(null);
+
+  useEffect(() => {
+    if (html !== null || !ref.current) return;
+    const observer = new IntersectionObserver(async (entries) => {
+      if (!entries[0].isIntersecting) return;
+      observer.disconnect();
+      try {
+        const response = await axios.get(`${API}/modules/${moduleId}/sections/${section.index}`);
+        setHtml(response.data.html);
+      } catch (error) {
+        console.error("Error loading section:", error);
+      }
+    }, { rootMargin: "400px" });
+    observer.observe(ref.current);
+    return () => observer.disconnect();
+  }, [html, moduleId, section.index]);
+
+  if (html === null) {
+    return <div ref={ref} className="h-32 animate-pulse rounded bg-gray-100" aria-label={section.title} />;
+  }
+  return <div dangerouslySetInnerHTML={{ __html: html }} />;
+};
 
 const ModuleDetail = () => {
   const { moduleId } = useParams();
@@ -30,7 +57,9 @@ const ModuleDetail = () => {
 
   useEffect(() => {
     const storedUser = localStorage.getItem("user");
-    if (!storedUser) {
+    // Users saved before sessions existed have no token and must start again
+    if (!storedUser || !JSON.parse(storedUser).token) {
+      localStorage.removeItem("user");
       navigate("/");
       return;
     }
@@ -42,13 +71,8 @@ const ModuleDetail = () => {
 
   const loadModule = async () => {
     try {
-      const [moduleRes, assessmentRes] = await Promise.all([
-        axios.get(`${API}/modules/${moduleId}`),
-        axios.get(`${API}/assessments/${moduleId}`)
-      ]);
-      
+      const moduleRes = await axios.get(`${API}/modules/${moduleId}`, { params: { format: "html" } });
       setModule(moduleRes.data);
-      setAssessment(assessmentRes.data);
     } catch (error) {
       console.error("Error loading module:", error);
       toast.error("Failed to load module");
@@ -57,10 +81,18 @@ const ModuleDetail = () => {
     }
   };
 
-  const handleStartAssessment = () => {
-    setCurrentSection('assessment');
-    setAnswers({});
-    window.scrollTo({ top: 0, behavior: 'smooth' });
+  const handleStartAssessment = async () => {
+    // Every attempt (and retake) gets its own draw of questions from the bank
+    try {
+      const response = await axios.post(`${API}/assessments/${moduleId}/attempts`);
+      setAssessment(response.data);
+      setAnswers({});
+      setCurrentSection('assessment');
+      window.scrollTo({ top: 0, behavior: 'smooth' });
+    } catch (error) {
+      console.error("Error starting assessment:", error);
+      toast.error("Failed to start assessment");
+    }
   };
 
   const handleAnswerChange = (questionId, answer) => {
@@ -79,6 +111,7 @@ const ModuleDetail = () => {
     try {
       const response = await axios.post(`${API}/assessments/${moduleId}/submit`, {
         user_id: user.id,
+        attempt_id: assessment.attempt_id,
         answers: answers
       });
       
@@ -192,7 +225,9 @@ const ModuleDetail = () => {
               </CardHeader>
               <CardContent>
                 <div className="prose prose-slate max-w-none" data-testid="module-content">
-                  <ReactMarkdown>{module?.content}</ReactMarkdown>
+                  {module?.sections.map((section) => (
+                    <ModuleSection key={section.index} moduleId={moduleId} section={section} />
+                  ))}
                 </div>
               </CardContent>
             </Card>
@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+import pytest
+
+server = pytest.importorskip("server")
+
+ADMIN_ROUTES = [
+    ("POST", "/api/users/bulk"),
+    ("GET", "/api/analytics/modules"),
+    ("GET", "/api/feedback/queue"),
+    ("GET", "/api/catalog/stats"),
+]
+
+
+def _request(method, path, headers=None):
+    async def send():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, headers=headers or {})
+
+    return asyncio.run(send())
+
+
+@pytest.mark.parametrize("method,path", ADMIN_ROUTES)
+def test_admin_routes_reject_anonymous_callers(monkeypatch, method, path):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+
+    assert _request(method, path).status_code == 401
+    assert _request(method, path, {"x-admin-token": "wrong"}).status_code == 401
+
+
+@pytest.mark.parametrize("method,path", ADMIN_ROUTES)
+def test_admin_routes_are_closed_without_an_admin_token(monkeypatch, method, path):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", None)
+
+    assert _request(method, path, {"x-admin-token": "anything"}).status_code == 403
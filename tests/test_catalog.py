@@ -0,0 +1,41 @@
+from catalog import CatalogSnapshot
+
+
+def _catalog(modules):
+    return CatalogSnapshot(1, modules, [])
+
+
+def test_summary_pages_continue_inside_equal_orders():
+    modules = [
+        {"id": f"module-{i:02d}", "title": str(i), "description": "", "order": i // 3, "duration": "5 min"}
+        for i in range(14)
+    ]
+    catalog = _catalog(list(reversed(modules)))
+
+    for limit in (1, 2, 4, 14, 20):
+        seen, after, after_id = [], None, None
+        while True:
+            items, next_key = catalog.summary_page(after, limit, after_id)
+            seen.extend(item["id"] for item in items)
+            if next_key is None:
+                break
+            after, after_id = next_key
+        assert seen == [m["id"] for m in modules]
+
+
+def test_summary_page_after_order_alone_skips_the_whole_order():
+    modules = [{"id": f"m{i}", "title": "", "description": "", "order": i // 2, "duration": ""} for i in range(6)]
+
+    items, next_key = _catalog(modules).summary_page(0, 10)
+    assert [item["id"] for item in items] == ["m2", "m3", "m4", "m5"]
+    assert next_key is None
+
+
+def test_summaries_leave_out_lesson_bodies():
+    modules = [{"id": "m1", "title": "One", "description": "d", "order": 1, "duration": "5 min",
+                "content": "# Lesson\n\nLong body"}]
+
+    items, next_key = _catalog(modules).summary_page(None, 10)
+
+    assert items == [{"id": "m1", "title": "One", "description": "d", "order": 1, "duration": "5 min"}]
+    assert next_key is None
@@ -0,0 +1,51 @@
+import asyncio
+import csv
+import io
+
+import pytest
+
+from export import CSV, PARQUET, export_progress
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def _db(names):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+
+    async def fill():
+        await db.users.insert_many([{"id": f"u{i}", "name": name, "role": "staff"} for i, name in enumerate(names)])
+        await db.progress.insert_many([
+            {"user_id": f"u{i}", "module_id": "m1", "completed": True, "score": 3,
+             "total_questions": 3, "completed_at": "2026-01-01T00:00:00"}
+            for i in range(len(names))
+        ])
+
+    asyncio.run(fill())
+    return db
+
+
+def _export(db, fmt, batch_size=2):
+    async def collect():
+        return b"".join([chunk async for chunk in export_progress(db, fmt, batch_size=batch_size)])
+
+    return asyncio.run(collect())
+
+
+def test_csv_cells_that_look_like_formulas_are_escaped():
+    names = ["=HYPERLINK(\"http://x\")", "+1", "-2", "@SUM(A1)", "Ada Lovelace"]
+    rows = list(csv.DictReader(io.StringIO(_export(_db(names), CSV).decode())))
+
+    assert [row["user_name"] for row in rows] == [
+        "'=HYPERLINK(\"http://x\")", "'+1", "'-2", "'@SUM(A1)", "Ada Lovelace",
+    ]
+    assert rows[0]["completed_at"] == "2026-01-01T00:00:00"
+
+
+def test_parquet_export_has_every_row():
+    pq = pytest.importorskip("pyarrow.parquet")
+    names = [f"user {i}" for i in range(5)]
+
+    table = pq.read_table(io.BytesIO(_export(_db(names), PARQUET)))
+
+    assert table.num_rows == 5
+    assert sorted(table.column("user_name").to_pylist()) == names
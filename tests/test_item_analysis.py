@@ -0,0 +1,55 @@
+import asyncio
+import random
+
+import numpy as np
+import pytest
+
+from item_analysis import analyze, load_responses, log_entry
+from scoring import AnswerKey
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+QUESTIONS = 80
+
+
+def _assessment():
+    return {
+        "id": "a1", "module_id": "m1",
+        "questions": [
+            {"id": f"q{i}", "question": f"Question {i}", "options": ["A", "B", "C"], "correct_answer": "A"}
+            for i in range(QUESTIONS)
+        ],
+    }
+
+
+def test_drawn_and_whole_bank_entries_are_analyzed_per_question_shown():
+    assessment = _assessment()
+    key = AnswerKey.compile(assessment)
+    rng = random.Random(7)
+    entries, shown, right = [], np.zeros(QUESTIONS), np.zeros(QUESTIONS)
+    for n in range(60):
+        questions = None if n % 4 == 0 else rng.sample(range(QUESTIONS), 20)
+        order = range(QUESTIONS) if questions is None else questions
+        answers = {f"q{i}": rng.choice(["A", "A", "B", "C"]) for i in order}
+        for i in order:
+            shown[i] += 1
+            right[i] += answers[f"q{i}"] == "A"
+        entries.append(log_entry(
+            f"attempt-{n}", "u1", "m1", key.fingerprint, key.packed_mask(answers, questions),
+            key.choices(answers, questions), "2024-01-01T00:00:00", questions,
+        ))
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"]["attempt_log"]
+        await collection.insert_many(entries)
+        return await load_responses(collection.database, key)
+
+    responses = asyncio.run(scenario())
+    assert len(responses.attempt) == shown.sum()
+
+    report = analyze(assessment, key, responses)
+    assert report["attempts"] == 60
+    for i, question in enumerate(report["questions"]):
+        assert question["attempts"] == shown[i]
+        assert question["p_value"] == pytest.approx(right[i] / shown[i], abs=1e-4)
+        assert sum(o["selection_rate"] for o in question["options"]) == pytest.approx(1, abs=1e-3)
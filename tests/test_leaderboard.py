@@ -0,0 +1,130 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from leaderboard import Leaderboard, RankedSet, bump_leaderboard_version
+
+
+def _filled(keys, seed=0):
+    ranked = RankedSet(seed=seed)
+    for key in keys:
+        ranked.insert(key)
+    return ranked
+
+
+def test_rank_and_slice_follow_key_order():
+    keys = random.Random(1).sample(range(10000), 500)
+    ranked = _filled(keys)
+    expected = sorted(keys)
+
+    assert len(ranked) == 500
+    assert list(ranked.slice(0, 500)) == expected
+    for position in (0, 1, 250, 498, 499):
+        assert ranked.rank(expected[position]) == position
+        assert list(ranked.slice(position, 3)) == expected[position:position + 3]
+
+
+def test_slice_bounds():
+    ranked = _filled(range(10))
+
+    assert list(ranked.slice(8, 5)) == [8, 9]
+    assert list(ranked.slice(10, 5)) == []
+    assert list(ranked.slice(3, 0)) == []
+    assert list(RankedSet().slice(0, 10)) == []
+
+
+def test_remove_keeps_ranks_consistent():
+    rng = random.Random(2)
+    keys = rng.sample(range(5000), 300)
+    ranked = _filled(keys, seed=3)
+    remaining = sorted(keys)
+
+    for key in rng.sample(keys, 150):
+        ranked.remove(key)
+        remaining.remove(key)
+        assert len(ranked) == len(remaining)
+
+    assert list(ranked.slice(0, len(remaining))) == remaining
+    for position, key in enumerate(remaining):
+        assert ranked.rank(key) == position
+
+
+def test_interleaved_operations_match_a_sorted_list():
+    rng = random.Random(4)
+    ranked = RankedSet(seed=5)
+    reference = []
+    for _ in range(2000):
+        if reference and rng.random() < 0.4:
+            key = rng.choice(reference)
+            ranked.remove(key)
+            reference.remove(key)
+        else:
+            key = (rng.randint(-100, 0), rng.random())
+            ranked.insert(key)
+            reference.append(key)
+            reference.sort()
+        start = rng.randrange(len(reference) + 1)
+        assert list(ranked.slice(start, 5)) == reference[start:start + 5]
+    for position, key in enumerate(reference):
+        assert ranked.rank(key) == position
+
+
+def test_missing_keys_raise():
+    ranked = _filled([1, 3, 5])
+
+    with pytest.raises(KeyError):
+        ranked.rank(2)
+    with pytest.raises(KeyError):
+        ranked.remove(6)
+    assert len(ranked) == 3
+
+
+def _progress(user_id, module_id, score, updated_at):
+    return {"user_id": user_id, "module_id": module_id, "score": score, "completed": True,
+            "completed_at": "2026-01-01T00:00:00", "updated_at": updated_at}
+
+
+def test_sync_folds_in_other_workers_progress_without_rebuilding():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        await db.users.insert_many([{"id": "a", "name": "A", "role": "staff"},
+                                    {"id": "b", "name": "B", "role": "student"}])
+        # Synced long ago: outside the window, so only the rebuild sees it
+        await db.progress.insert_one(_progress("a", "m1", 3, now - timedelta(days=1)))
+        board = Leaderboard(db)
+        await board.rebuild()
+        # Written by another worker after this one was built
+        await db.progress.insert_one(_progress("b", "m1", 5, datetime.now(timezone.utc)))
+        await board.sync()
+        await board.sync()
+        return board
+
+    board = asyncio.run(scenario())
+    assert [entry["user_id"] for entry in board.top()] == ["b", "a"]
+    assert board.rank_of("b", "student")["rank"] == 1
+    assert board.stats()["rebuilds"] == 1 and board.stats()["syncs"] == 2
+
+
+def test_sync_rebuilds_when_the_version_is_bumped():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+
+    async def scenario():
+        await db.progress.insert_one(_progress("a", "m1", 3, datetime.now(timezone.utc)))
+        board = Leaderboard(db)
+        await board.rebuild()
+        await db.progress.delete_many({})
+        await board.sync()
+        assert board.size() == 1
+        await bump_leaderboard_version(db)
+        await board.sync()
+        return board
+
+    board = asyncio.run(scenario())
+    assert board.size() == 0
+    assert board.stats()["rebuilds"] == 2
@@ -0,0 +1,36 @@
+import asyncio
+import os
+
+from metrics import Counter, Gauge, Histogram, MultiProcessStore, Registry
+
+# Far above any real pid, so it reads as a worker that has exited
+DEAD_PID = 2 ** 22 + 12345
+
+
+def _worker(directory, pid, requests, in_flight):
+    registry = Registry()
+    counter = registry.register(Counter("http_requests_total", "Requests", ("route",)))
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)))
+    gauge = registry.register(Gauge("in_flight", "In flight"))
+    counter.inc("/a", amount=requests)
+    latency.observe("/a", value=0.05)
+    gauge.set(value=in_flight)
+    store = MultiProcessStore(registry, directory)
+    store.pid = pid
+    return store
+
+
+def test_scrape_merges_every_worker(tmp_path):
+    live = _worker(tmp_path, os.getpid(), 3, 2)
+    dead = _worker(tmp_path, DEAD_PID, 4, 7)
+    dead.flush()
+
+    lines = asyncio.run(live.render()).splitlines()
+
+    # Counters and histograms add up, including a worker that has exited
+    assert 'http_requests_total{route="/a"} 7' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_count{route="/a"} 2' in lines
+    # Gauges are per live worker
+    assert f'in_flight{{pid="{os.getpid()}"}} 2' in lines
+    assert not any(line.startswith("in_flight") and str(DEAD_PID) in line for line in lines)
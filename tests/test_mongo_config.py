@@ -0,0 +1,24 @@
+from mongo_config import pool_size_per_worker, worker_count
+
+
+def test_worker_count_prefers_web_concurrency(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+
+    assert worker_count(["uvicorn", "server:app", "--workers", "8"]) == 4
+
+
+def test_worker_count_falls_back_to_the_server_command_line(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+
+    assert worker_count(["uvicorn", "server:app", "--workers", "8"]) == 8
+    assert worker_count(["uvicorn", "server:app", "--workers=3"]) == 3
+    assert worker_count(["gunicorn", "-w", "5", "server:app"]) == 5
+    assert worker_count(["uvicorn", "server:app"]) == 1
+
+
+def test_pool_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.delenv("MONGO_MAX_POOL_SIZE", raising=False)
+    monkeypatch.setenv("MONGO_POOL_BUDGET", "200")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+
+    assert pool_size_per_worker() == 50
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursor, _after, decode_cursor, encode_cursor, keyset_page
+
+
+def test_cursor_round_trip_keeps_bson_types():
+    values = [datetime(2024, 5, 1, 12, 30), "abc", 3]
+
+    assert decode_cursor("progress", encode_cursor("progress", values), 3) == values
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor("feedback", [1, 2]), encode_cursor("progress", [1])])
+def test_foreign_or_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor("progress", cursor, 2)
+
+
+def test_after_filter_branches():
+    sort = [("completed_at", -1), ("module_id", 1), ("_id", -1)]
+
+    assert _after(sort, ["t", "m", "x"]) == {"$or": [
+        {"completed_at": {"$lt": "t"}},
+        {"completed_at": "t", "module_id": {"$gt": "m"}},
+        {"completed_at": "t", "module_id": "m", "_id": {"$lt": "x"}},
+    ]}
+
+
+def test_keyset_pages_walk_ties_without_gaps_or_repeats():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["progress"]
+    # Many rows share a sort value, so pages have to continue inside a tie
+    rows = [{"_id": f"{i:03d}", "score": i % 4} for i in range(37)]
+    sort = [("score", -1), ("_id", -1)]
+
+    async def walk(limit):
+        await collection.delete_many({})
+        await collection.insert_many([dict(row) for row in rows])
+        seen, cursor = [], None
+        while True:
+            items, cursor = await keyset_page(collection, "progress", {}, sort, limit, cursor)
+            assert len(items) <= limit
+            seen.extend(item["score"] for item in items)
+            if cursor is None:
+                return seen
+
+    # _id is not returned, but the scores must come out in order and complete
+    for limit in (1, 5, 10, 37, 50):
+        assert asyncio.run(walk(limit)) == sorted((row["score"] for row in rows), reverse=True)
+
+
+def test_filtered_listing_pages_and_keeps_cursors_to_itself():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["progress"]
+    rows = [{"user_id": f"u{i % 2}", "module_id": f"m{i:02d}"} for i in range(20)]
+
+    async def walk():
+        await collection.insert_many(rows)
+        seen, cursor = [], None
+        while True:
+            items, cursor = await keyset_page(
+                collection, "progress:user:u1", {"user_id": "u1"}, [("module_id", 1)], 3, cursor
+            )
+            seen.extend(item["module_id"] for item in items)
+            if cursor is None:
+                return seen
+            # A cursor from one user's listing is no good for another's
+            with pytest.raises(InvalidCursor):
+                await keyset_page(collection, "progress:user:u0", {"user_id": "u0"}, [("module_id", 1)], 3, cursor)
+
+    assert asyncio.run(walk()) == [f"m{i:02d}" for i in range(1, 20, 2)]
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from profiler import RequestProfiler
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def test_settings_changed_on_one_worker_reach_the_others(tmp_path):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    first, second = (RequestProfiler(tmp_path, db=db) for _ in range(2))
+
+    async def scenario():
+        status = await first.update(enabled=True, threshold_ms=50.0, sample_rate=None)
+        await second.sync()
+        return status
+
+    try:
+        status = asyncio.run(scenario())
+        assert status["enabled"] and status["threshold_ms"] == 50.0 and status["settings_version"] == 1
+        assert second.enabled and second.threshold_ms == 50.0
+        assert second.sample_rate == 0.0 and second.settings_version == 1
+    finally:
+        first.disable()
+        second.disable()
+
+
+def test_sync_leaves_local_settings_alone_until_something_is_stored(tmp_path):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    profiler = RequestProfiler(tmp_path, threshold_ms=200.0, db=db)
+
+    asyncio.run(profiler.sync())
+
+    assert not profiler.enabled and profiler.threshold_ms == 200.0
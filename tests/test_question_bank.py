@@ -0,0 +1,62 @@
+import pytest
+
+from question_bank import StaleAttempt, attempt_draw, draw, draw_size, new_attempt, present
+from scoring import AnswerKey
+
+
+def _assessment(size, draw=None):
+    assessment = {
+        "id": "a1", "module_id": "m1",
+        "questions": [
+            {"id": f"q{i}", "question": f"Question {i}", "options": ["A", "B", "C", "D"], "correct_answer": "A"}
+            for i in range(size)
+        ],
+    }
+    if draw is not None:
+        assessment["draw"] = draw
+    return assessment
+
+
+def test_draw_size_prefers_the_assessment_then_the_default_then_the_bank():
+    assert draw_size(_assessment(200, draw=25), 10) == 25
+    assert draw_size(_assessment(200), 10) == 10
+    assert draw_size(_assessment(200), 0) == 200
+    assert draw_size(_assessment(5, draw=25), 0) == 5
+
+
+def test_draws_are_reproducible_from_the_seed():
+    assessment = _assessment(5000)
+
+    first = draw(assessment, 30, seed=42)
+    assert first == draw(assessment, 30, seed=42)
+    assert first != draw(assessment, 30, seed=43)
+    assert len(set(first.questions)) == 30
+    assert all(0 <= index < 5000 for index in first.questions)
+    assert all(sorted(order) == [0, 1, 2, 3] for order in first.option_orders)
+
+
+def test_attempt_is_rebuilt_and_presented_without_answers():
+    assessment = _assessment(50)
+    key = AnswerKey.compile(assessment)
+    attempt = new_attempt("u1", key, 10)
+    public = {**assessment, "questions": [
+        {k: v for k, v in q.items() if k != "correct_answer"} for q in assessment["questions"]
+    ]}
+
+    drawn = attempt_draw(attempt, assessment, key)
+    shown = present(public, attempt, drawn)
+    assert shown["attempt_id"] == attempt["_id"]
+    assert [q["id"] for q in shown["questions"]] == [f"q{i}" for i in drawn.questions]
+    for question, order in zip(shown["questions"], drawn.option_orders):
+        assert "correct_answer" not in question
+        assert question["options"] == [["A", "B", "C", "D"][i] for i in order]
+
+
+def test_attempt_from_an_older_answer_key_is_stale():
+    key = AnswerKey.compile(_assessment(10))
+    attempt = new_attempt("u1", key, 5)
+    changed = _assessment(10)
+    changed["questions"][0]["correct_answer"] = "B"
+
+    with pytest.raises(StaleAttempt):
+        attempt_draw(attempt, changed, AnswerKey.compile(changed))
@@ -0,0 +1,15 @@
+import json
+
+from responses import BEST, FAST, EncodedPayload
+
+
+def test_compressed_etags_name_the_compression_settings():
+    body = json.dumps([{"id": i, "title": "Module %d" % i} for i in range(200)]).encode()
+    fast = EncodedPayload(body, compression=FAST)
+    best = EncodedPayload(body, compression=BEST)
+
+    assert fast.etags["identity"] == best.etags["identity"]
+    for coding in fast.bodies:
+        if coding != "identity":
+            assert fast.etags[coding] != best.etags[coding]
+    assert best.etags["gzip"].endswith('-gzip9"')
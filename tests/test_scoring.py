@@ -0,0 +1,41 @@
+import bson
+import numpy as np
+
+from scoring import NO_ANSWER, OTHER_ANSWER, AnswerKey
+
+
+def _key(size):
+    return AnswerKey.compile({
+        "id": "a1", "module_id": "m1",
+        "questions": [
+            {"id": f"q{i}", "question": "?", "options": ["Yes", "No", "Maybe"], "correct_answer": "No"}
+            for i in range(size)
+        ],
+    })
+
+
+def test_mask_and_choices_follow_the_bank_order():
+    key = _key(4)
+    answers = {"q0": "No", "q1": " yes ", "q3": "Nope"}
+
+    assert key.mask(answers) == 0b0001
+    assert key.choices(answers) == bytes([1, 0, NO_ANSWER, OTHER_ANSWER])
+
+
+def test_drawn_questions_map_to_bits_in_draw_order():
+    key = _key(6)
+    answers = {"q5": "No", "q2": "Yes", "q0": "No"}
+
+    assert key.mask(answers, [5, 2, 0]) == 0b101
+    assert key.choices(answers, [5, 2, 0]) == bytes([1, 0, 1])
+
+
+def test_packed_mask_fits_bson_for_large_banks():
+    key = _key(100)
+    answers = {f"q{i}": "No" for i in range(0, 100, 3)}
+
+    packed = key.packed_mask(answers)
+    assert len(packed) == 13
+    bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), bitorder="little")[:100]
+    assert list(np.flatnonzero(bits)) == list(range(0, 100, 3))
+    bson.encode({"mask": packed})
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from task_queue import FAILED, PENDING, TaskQueue, _now
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def _outbox():
+    return mongomock_motor.AsyncMongoMockClient()["test"]["outbox"]
+
+
+def test_slow_jobs_are_not_reclaimed_by_their_own_process():
+    async def scenario():
+        outbox = _outbox()
+        # Each job outlasts the lease, and the backlog waits even longer
+        queue = TaskQueue(outbox, workers=1, lease=0.2, poll_interval=0.05)
+        runs = []
+
+        async def slow(payload):
+            runs.append(payload['n'])
+            await asyncio.sleep(0.3)
+
+        queue.register("slow", ("step", slow))
+        queue.start()
+        for n in range(3):
+            await queue.enqueue("slow", {"n": n})
+        await queue.join()
+        await asyncio.sleep(0.2)
+        await queue.stop()
+        return runs, queue.stats(), await outbox.count_documents({})
+
+    runs, stats, left = asyncio.run(scenario())
+    assert sorted(runs) == [0, 1, 2]
+    assert stats['recovered'] == 0 and stats['completed'] == 3
+    assert left == 0
+
+
+def test_job_taken_over_by_another_process_is_skipped():
+    async def scenario():
+        outbox = _outbox()
+        first, second = (TaskQueue(outbox, lease=0.2) for _ in range(2))
+        runs = []
+
+        async def step(payload):
+            runs.append(payload)
+
+        for queue in (first, second):
+            queue.register("job", ("step", step))
+        now = _now()
+        job = {"_id": "j", "kind": "job", "payload": {"n": 1}, "status": PENDING, "attempts": 0,
+               "done": [], "run_after": now, "owner": first.owner, "lease_until": now}
+        await outbox.insert_one(dict(job))
+        # The first owner's lease lapsed while the job sat in its queue
+        await second._claim_lapsed()
+        await second._run(second._queue.get_nowait())
+        await first._run(job)
+        return runs, first.stats()['lost']
+
+    runs, lost = asyncio.run(scenario())
+    assert runs == [{"n": 1}]
+    assert lost == 1
+
+
+def test_failed_steps_retry_alone_then_park_the_job():
+    async def scenario():
+        outbox = _outbox()
+        queue = TaskQueue(outbox, max_attempts=3, backoff_base=0.01, backoff_max=0.01)
+        calls = {"ok": 0, "broken": 0}
+
+        async def ok(payload):
+            calls["ok"] += 1
+
+        async def broken(payload):
+            calls["broken"] += 1
+            raise RuntimeError("boom")
+
+        queue.register("job", ("ok", ok), ("broken", broken))
+        queue.start()
+        await queue.enqueue("job", {})
+        while queue.stats()['failed'] == 0:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return calls, await outbox.find_one({})
+
+    calls, job = asyncio.run(scenario())
+    assert calls == {"ok": 1, "broken": 3}
+    assert job['status'] == FAILED and job['attempts'] == 3 and job['done'] == ["ok"]
+
+
+def test_guard_drops_duplicate_jobs_before_their_steps():
+    async def scenario():
+        outbox = _outbox()
+        queue = TaskQueue(outbox)
+        claimed, runs = {}, []
+
+        async def claim(payload):
+            # First submission of a thing wins; a retry of the same one still passes
+            return claimed.setdefault(payload['thing'], payload['submission']) == payload['submission']
+
+        async def step(payload):
+            runs.append(payload['submission'])
+
+        queue.register("job", ("step", step), guard=claim)
+        for submission in ("s1", "s2", "s1"):
+            await queue.enqueue("job", {"thing": "t", "submission": submission})
+        return runs, queue.stats(), await outbox.count_documents({})
+
+    runs, stats, left = asyncio.run(scenario())
+    assert runs == ["s1", "s1"]
+    assert stats['dropped'] == 1 and stats['completed'] == 2
+    assert left == 0
+
+
+def test_caller_chosen_job_ids_are_unique_in_the_outbox():
+    from pymongo.errors import DuplicateKeyError
+
+    async def scenario():
+        outbox = _outbox()
+        queue = TaskQueue(outbox)
+
+        release = asyncio.Event()
+
+        async def step(payload):
+            await release.wait()
+
+        queue.register("job", ("step", step))
+        queue.start()
+        await queue.enqueue("job", {}, job_id="submission:a")
+        with pytest.raises(DuplicateKeyError):
+            await queue.enqueue("job", {}, job_id="submission:a")
+        release.set()
+        await queue.stop()
+        # Once the first one is done the id is free again
+        await queue.enqueue("job", {}, job_id="submission:a")
+
+    asyncio.run(scenario())